@@ -1,48 +1,223 @@
+import logging
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
 
-from dataclasses import dataclass, field
-from typing import ClassVar, Dict, List, Union
+import numpy as np
+
+log = logging.getLogger(__name__)
 
 
-@dataclass
 class Category:
-    name: str
-    parent_category: Union["Category", None]
-    space_count: int
-    subcategories: List["Category"] = field(default_factory=lambda: [])
-    values: Dict[str, int] = field(default_factory=lambda: {})
-    level: int = 0
-    
-    categories_created: ClassVar[set] = set()
-    
-    def __post_init__(self):
-        self.categories_created.add(self)
-        self.level = self.space_count // 2
-    
-    def __hash__(self) -> int:
-        return hash(self.name)
-    
+    """One node of the expenditure hierarchy.
+
+    Nodes are immutable and compared by identity. A hierarchy is created all at once by `build_hierarchy`;
+    nothing else holds on to its nodes, so the nodes of a dataset that has been replaced are freed with it.
+    """
+
+    __slots__ = ('name', 'parent_category', 'space_count', 'subcategories', 'values', 'level')
+
+    def __init__(self, name: str, parent_category: Optional["Category"] = None, space_count: int = 0,
+                 subcategories: Sequence["Category"] = (), values: Optional[Mapping[str, float]] = None):
+        _set = object.__setattr__
+        _set(self, 'name', name)
+        _set(self, 'parent_category', parent_category)
+        _set(self, 'space_count', space_count)
+        _set(self, 'subcategories', tuple(subcategories))
+        _set(self, 'values', values if values is not None else {})
+        _set(self, 'level', space_count // 2)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'Category is immutable, cannot set {key!r}')
+
+    def __delattr__(self, key):
+        raise AttributeError(f'Category is immutable, cannot delete {key!r}')
+
     def __repr__(self) -> str:
-        current_category = self
-        while current_category:
-            current_category = current_category.parent_category
-            
-        return f"Category: {self.name} | Level: {self.level} | Top-Level Parent: {current_category.name if current_category else 'None'}"
-    
-    def add_child(self, other: "Category"):
-        print(f'{self} adding child {other}')
-        if self == other: raise ValueError
-        self.subcategories.append(other)
-        other.parent_category = self
-        
-    @classmethod
-    def find_by_level(cls, level) -> List["Category"]:
-        return [i for i in cls.categories_created if i.level == level]
-    
-    @classmethod
-    def find_by_name(cls, name) -> "Category":
-        return [i for i in cls.categories_created if i.name == name][0]
-    
+        top_level = self
+        while top_level.parent_category:
+            top_level = top_level.parent_category
+
+        return f"Category: {self.name} | Level: {self.level} | Top-Level Parent: {top_level.name if top_level is not self else 'None'}"
+
     def get_age_group(self, key):
         return self.values[key]
-    
-    
\ No newline at end of file
+
+
+def build_hierarchy(rows: Iterable[Tuple[str, int, int, Mapping[str, float]]]) -> List[Category]:
+    """Categories for (name, space count, parent row, values) rows, where a parent row always comes before its children"""
+    categories: List[Category] = []
+    children: List[List[Category]] = []
+    for name, space_count, parent_idx, values in rows:
+        category = Category(name, categories[parent_idx] if parent_idx >= 0 else None, space_count, values=values)
+        if parent_idx >= 0: children[parent_idx].append(category)
+        categories.append(category)
+        children.append([])
+    for category, subcategories in zip(categories, children):
+        if subcategories: object.__setattr__(category, 'subcategories', tuple(subcategories))
+    log.debug(f'Built {len(categories)} categories')
+    return categories
+
+
+class AgeGroupValues(Mapping):
+    """Read-only view of one category's row in a CategoryTree's expenditure matrix"""
+
+    __slots__ = ('_row', '_columns')
+
+    def __init__(self, row: np.ndarray, columns: Dict[str, int]):
+        self._row = row
+        self._columns = columns
+
+    def __getitem__(self, key: str) -> float:
+        return self._row[self._columns[key]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class CategoryTree:
+    """Read-only index over a category hierarchy, built once from the loaded categories.
+
+    Nodes are numbered in depth-first order, top-level categories in the order given. Lookups by name, by level, by parent and the
+    path from the top-level category down to a node are all answered from precomputed tables.
+    Categories whose parent is not part of the given collection (e.g. filtered out) become roots.
+
+    The numbers are held column-wise in `matrix` (categories x age groups, rows in node order) next to a
+    `parent_idx` array, so totals over a subtree are single array reductions. Because of the
+    depth-first numbering every subtree occupies a contiguous block of rows. `child_totals` holds the sum of
+    every node's direct subcategories and `root_total` the sum of the top-level categories, the totals of
+    the rows the pages list, computed once here so renders only read them.
+    """
+
+    def __init__(self, categories: Iterable[Category], age_groups: Optional[Sequence[str]] = None):
+        categories = list(categories)
+        members = {id(i) for i in categories}
+        roots = [i for i in categories if i.parent_category is None or id(i.parent_category) not in members]
+
+        self.nodes: List[Category] = []
+        self._index_of: Dict[int, int] = {}
+        self._parent: List[int] = []
+        self._children: List[List[int]] = []
+        self._paths: List[Tuple[Category, ...]] = []
+        self._by_name: Dict[str, List[int]] = {}
+        self._by_level: Dict[int, List[Category]] = {}
+
+        stack: List[Tuple[Category, int]] = [(i, -1) for i in reversed(roots)]
+        while stack:
+            node, parent_idx = stack.pop()
+            if id(node) in self._index_of: continue
+
+            idx = len(self.nodes)
+            self.nodes.append(node)
+            self._index_of[id(node)] = idx
+            self._parent.append(parent_idx)
+            self._children.append([])
+            self._paths.append((self._paths[parent_idx] if parent_idx >= 0 else ()) + (node,))
+            self._by_name.setdefault(node.name, []).append(idx)
+            self._by_level.setdefault(node.level, []).append(node)
+            if parent_idx >= 0: self._children[parent_idx].append(idx)
+
+            children = [i for i in node.subcategories if id(i) in members]
+            stack.extend((i, idx) for i in reversed(children))
+
+        if age_groups is None:
+            age_groups = list(self.nodes[0].values) if self.nodes else []
+        self.age_groups: Tuple[str, ...] = tuple(age_groups)
+        self._columns: Dict[str, int] = {age_grp: i for i, age_grp in enumerate(self.age_groups)}
+
+        n = len(self.nodes)
+        self.parent_idx = np.array(self._parent, dtype=np.intp)
+        self.is_leaf = np.array([not i for i in self._children], dtype=bool)
+        self.subtree_end = np.arange(1, n + 1, dtype=np.intp)
+        for idx in range(n - 1, -1, -1):
+            if self._parent[idx] >= 0:
+                self.subtree_end[self._parent[idx]] = max(self.subtree_end[self._parent[idx]], self.subtree_end[idx])
+
+        self.matrix = np.array(
+            [[float(node.values.get(age_grp, np.nan)) for age_grp in self.age_groups] for node in self.nodes],
+            dtype=np.float64,
+        ).reshape(n, len(self.age_groups))
+        self.matrix.flags.writeable = False
+
+        has_parent = self.parent_idx >= 0
+        self.child_totals = np.zeros_like(self.matrix)
+        np.add.at(self.child_totals, self.parent_idx[has_parent], self.matrix[has_parent])
+        self.root_total = self.matrix[~has_parent].sum(axis=0)
+        self.child_totals.flags.writeable = False
+        self.root_total.flags.writeable = False
+
+        # among categories sharing a label, prefer the shallowest one, then the one whose path sorts first
+        for name, idxs in self._by_name.items():
+            idxs.sort(key=lambda i: (len(self._paths[i]), [j.name for j in self._paths[i]]))
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __iter__(self) -> Iterator[Category]:
+        return iter(self.nodes)
+
+    def __contains__(self, category: Category) -> bool:
+        return id(category) in self._index_of
+
+    @property
+    def roots(self) -> List[Category]:
+        return [self.nodes[i] for i, parent in enumerate(self._parent) if parent < 0]
+
+    def index_of(self, category: Category) -> int:
+        try:
+            return self._index_of[id(category)]
+        except KeyError:
+            raise KeyError(f'{category.name} is not part of this tree') from None
+
+    def find_by_level(self, level: int) -> List[Category]:
+        return list(self._by_level.get(level, []))
+
+    def find_by_name(self, name: str, parent: Optional[Category] = None) -> Category:
+        """Look up a category by its label.
+
+        When the same label appears under several parents, passing `parent` picks the one under it;
+        otherwise the shallowest match (ties broken by path) is returned.
+        """
+        idxs = self._by_name.get(name)
+        if not idxs:
+            raise KeyError(f'No category named {name!r}')
+        if parent is not None:
+            parent_idx = self.index_of(parent)
+            for i in idxs:
+                if self._parent[i] == parent_idx: return self.nodes[i]
+            raise KeyError(f'No category named {name!r} under {parent.name!r}')
+        return self.nodes[idxs[0]]
+
+    def children_of(self, category: Category) -> List[Category]:
+        return [self.nodes[i] for i in self._children[self.index_of(category)]]
+
+    def path_of(self, category: Category) -> Tuple[Category, ...]:
+        """Ancestors of `category` from its top-level category down to (and including) itself"""
+        return self._paths[self.index_of(category)]
+
+    def column(self, age_group: str) -> int:
+        try:
+            return self._columns[age_group]
+        except KeyError:
+            raise KeyError(f'Unknown age group {age_group!r}') from None
+
+    def values_of(self, categories: Sequence[Category], age_group: str) -> np.ndarray:
+        """Amounts for `age_group` of each of `categories`, in the given order"""
+        rows = np.fromiter((self.index_of(i) for i in categories), dtype=np.intp, count=len(categories))
+        return self.matrix[rows, self.column(age_group)]
+
+    def total(self, parent: Optional[Category], age_group: str) -> float:
+        """Sum of the subcategories of `parent` (or of the top-level categories when None) for `age_group`"""
+        totals = self.root_total if parent is None else self.child_totals[self.index_of(parent)]
+        return float(totals[self.column(age_group)])
+
+    def subtree_sum(self, category: Category) -> np.ndarray:
+        """Sum of the leaf categories under (and including) `category`, one entry per age group"""
+        start = self.index_of(category)
+        end = self.subtree_end[start]
+        block = self.matrix[start:end]
+        return block[self.is_leaf[start:end]].sum(axis=0)
@@ -0,0 +1,8 @@
+"""Benchmarks for the data pipeline and for whole reruns of the app.
+
+    python -m benchmarks run --output before.json            # everything, scaled datasets up to 1000x
+    python -m benchmarks run --group tree df --scales 1 10   # a subset
+    python -m benchmarks compare before.json after.json      # exits with 1 when something got slower
+    python -m benchmarks imports --page household            # what the first render of a page imports
+    python -m benchmarks load --sessions 1 10 50             # concurrent sessions: latency, throughput, memory
+"""
@@ -0,0 +1,97 @@
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+from benchmarks import __doc__, bench_data, bench_app, harness, loadtest, startup  # noqa: F401  (registers the benchmarks)
+
+
+def _run(args) -> int:
+    selected = [
+        i for i in harness.BENCHMARKS
+        if (not args.group or i.group in args.group) and (not args.filter or any(f in i.name for f in args.filter))
+    ]
+    report = lambda name, result: print(
+        f'{name:<40} {harness.format_seconds(result.median):>10}  (min {harness.format_seconds(result.min)}, {result.repeat}x{result.number})',
+        flush=True,
+    )
+    results = harness.run(selected, args.scales, args.repeat, report)
+    if args.output:
+        harness.save(results, args.output)
+        print(f'Wrote {len(results)} results to {args.output}')
+    return 0
+
+
+def _compare(args) -> int:
+    rows = harness.compare(harness.load(args.base), harness.load(args.new), args.stat)
+    regressions = 0
+    for name, before, after, change in rows:
+        flag = ''
+        if change > args.threshold:
+            flag, regressions = 'REGRESSION', regressions + 1
+        elif change < -args.threshold:
+            flag = 'faster'
+        print(f'{name:<40} {harness.format_seconds(before):>10} -> {harness.format_seconds(after):>10}  {change:+7.1%}  {flag}')
+    print(f'{regressions} regression(s) over {args.threshold:.0%} in {len(rows)} benchmarks')
+    return 1 if regressions else 0
+
+
+def _imports(args) -> int:
+    rows = startup.import_report(args.page)
+    print(f'Modules first imported while rendering the {args.page} page in a fresh process:')
+    print(f'{"package":<30} {"cumulative":>12} {"self":>10}')
+    for package, cumulative, own in rows[:args.top]:
+        print(f'{package:<30} {cumulative:>9.1f} ms {own:>7.1f} ms')
+    print(f'{"total":<30} {sum(i[1] for i in rows):>9.1f} ms')
+    return 0
+
+
+def _load(args) -> int:
+    print(f'{"sessions":>8} {"reruns":>7} {"errors":>6} {"rerun/s":>8} {"p50":>8} {"p90":>8} {"p99":>8} {"max":>8} {"RSS":>9} {"RSS/sess":>9} {"state/sess":>10}')
+    fmt = lambda value, unit: f'{value:.1f} {unit}' if value is not None else 'n/a'
+    report = lambda r: print(
+        f'{r.sessions:>8} {r.reruns:>7} {r.errors:>6} {r.throughput:>8.1f} {r.p50_ms:>5.0f} ms {r.p90_ms:>5.0f} ms {r.p99_ms:>5.0f} ms {r.max_ms:>5.0f} ms'
+        f' {fmt(r.rss_mb, "MB"):>9} {fmt(r.rss_per_session_kb, "kB"):>9} {fmt(r.state_per_session_kb, "kB"):>10}',
+        flush=True,
+    )
+    results = loadtest.run_ramp(args.sessions, args.duration, args.scenario, report)
+    if args.output:
+        loadtest.save(results, args.output)
+        print(f'Wrote {len(results)} results to {args.output}')
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the benchmarks')
+    run.add_argument('--group', nargs='+', choices=sorted({i.group for i in harness.BENCHMARKS}))
+    run.add_argument('--filter', nargs='+', help='only benchmarks whose name contains one of these')
+    run.add_argument('--scales', type=int, nargs='+', default=list(harness.SCALES), help='category scale factors for scaled benchmarks')
+    run.add_argument('--repeat', type=int, default=7)
+    run.add_argument('--output', type=Path, help='JSON file to write the results to')
+
+    compare = commands.add_parser('compare', help='compare two result files')
+    compare.add_argument('base', type=Path)
+    compare.add_argument('new', type=Path)
+    compare.add_argument('--threshold', type=float, default=0.1, help='relative slowdown to flag, e.g. 0.1 for 10%%')
+    compare.add_argument('--stat', choices=('min', 'median', 'mean'), default='median')
+
+    imports = commands.add_parser('imports', help='report the imports a page pays for on its first render')
+    imports.add_argument('--page', choices=list(startup.PAGES), default='home')
+    imports.add_argument('--top', type=int, default=20)
+
+    load = commands.add_parser('load', help='simulate concurrent sessions and report latency, throughput and memory')
+    load.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10, 25, 50], help='numbers of concurrent sessions to ramp through')
+    load.add_argument('--duration', type=float, default=20.0, help='seconds to run each number of sessions for')
+    load.add_argument('--scenario', nargs='+', choices=list(loadtest.SCENARIOS), default=list(loadtest.SCENARIOS))
+    load.add_argument('--output', type=Path, help='JSON file to write the results to')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    return {'run': _run, 'compare': _compare, 'imports': _imports, 'load': _load}[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
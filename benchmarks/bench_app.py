@@ -0,0 +1,76 @@
+"""Whole script reruns of each page and of a scripted drill-down through the category grids"""
+from itertools import cycle
+
+from benchmarks.driver import Session
+from benchmarks.harness import benchmark
+
+DRILL_DOWN = [
+    ['FOOD AND NON-ALCOHOLIC BEVERAGES', 'FOOD'],
+    ['TRANSPORT', 'OPERATION OF PERSONAL TRANSPORT EQUIPMENT'],
+    ['HOUSING AND UTILITIES'],
+]
+
+
+def _on_page(button: str) -> Session:
+    session = Session()
+    session.rerun()
+    session.click(button).rerun()
+    return session
+
+
+@benchmark('rerun.home', 'rerun')
+def rerun_home():
+    session = Session()
+    session.rerun()
+    return session.rerun
+
+
+@benchmark('rerun.personal', 'rerun')
+def rerun_personal():
+    return _on_page('Personal Expenditure').rerun
+
+
+@benchmark('rerun.personal_edit', 'rerun')
+def rerun_personal_edit():
+    """A rerun triggered by editing an amount, alternating between two values so every rerun applies an edit"""
+    session = _on_page('Personal Expenditure')
+    amounts = cycle([300.0, 250.0])
+
+    def run():
+        session.edit(0, {'0:2': next(amounts)}).rerun()
+    return run
+
+
+@benchmark('rerun.personal_profile_change', 'rerun')
+def rerun_personal_profile_change():
+    session = _on_page('Personal Expenditure')
+    dwellings = cycle(session.find('selectbox', 'Your House').options)
+
+    def run():
+        session.select('Your House', next(dwellings)).rerun()
+    return run
+
+
+@benchmark('rerun.household', 'rerun')
+def rerun_household():
+    return _on_page('Household Expenditure').rerun
+
+
+@benchmark('rerun.household_categories', 'rerun')
+def rerun_household_categories():
+    session = _on_page('Household Expenditure')
+    session.check('View Expenditure by Category').rerun()
+    return session.rerun
+
+
+@benchmark('rerun.drill_down', 'rerun')
+def rerun_drill_down():
+    """Opens the category grids, then for each path selects a row per level, as a user clicking down the hierarchy"""
+    def run():
+        session = _on_page('Household Expenditure')
+        session.check('View Expenditure by Category').rerun()
+        for path in DRILL_DOWN:
+            for depth, category in enumerate(path):
+                session.select_grid_row(depth, category).rerun()
+        session.select('Age Group of Main Income Earner', '35 - 39').rerun()
+    return run
@@ -0,0 +1,164 @@
+"""Data loading, the category hierarchy and the estimate pipeline, timed without a browser session"""
+import importlib
+import logging
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+
+from Categories import CategoryTree
+import dataset
+from estimates import EstimateCube, household_member_count
+import export
+import generations
+from incremental import SpendingModel
+from similarity import ProfileIndex
+
+from benchmarks import synthetic
+from benchmarks.harness import benchmark
+
+LOOKUPS = 1000
+
+
+@lru_cache(maxsize=1)
+def app():
+    """main.py imported outside `streamlit run`; it renders the home page once, with nothing to send it to"""
+    for name in ('streamlit', 'streamlit.runtime.scriptrunner_utils.script_run_context', 'streamlit.runtime.caching.cache_data_api'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    return importlib.import_module('main')
+
+
+@contextmanager
+def tree_of(module, tree: CategoryTree):
+    """Makes main.py's `load_category_tree` return `tree` for the duration"""
+    previous, module.load_category_tree = module.load_category_tree, lambda: tree
+    try:
+        yield
+    finally:
+        module.load_category_tree = previous
+
+
+@benchmark('load.compile_sources', 'load')
+def compile_sources():
+    return dataset.compile_sources
+
+
+@benchmark('load.artifact', 'load')
+def load_artifact():
+    return dataset.load
+
+
+@benchmark('load.load_data_cold', 'load')
+def load_data_cold():
+    """A new generation of the dataset, everything the pages use built, as after a reload"""
+    return lambda: generations.Generation(0, dataset.cwd).build()
+
+
+@benchmark('tree.build', 'tree', scaled=True)
+def tree_build(scale):
+    categories = [i for i in synthetic.scaled_categories(scale) if 'total' not in i.name.lower()]
+    return lambda: CategoryTree(categories)
+
+
+@benchmark('tree.find_by_name', 'tree', scaled=True)
+def tree_find_by_name(scale):
+    tree = synthetic.scaled_tree(scale)
+    rng = np.random.default_rng(0)
+    names = [tree.nodes[i].name for i in rng.integers(len(tree), size=LOOKUPS)]
+
+    def run():
+        for name in names: tree.find_by_name(name)
+    return run
+
+
+@benchmark('tree.find_by_level', 'tree', scaled=True)
+def tree_find_by_level(scale):
+    tree = synthetic.scaled_tree(scale)
+    levels = sorted(set(tree.levels.tolist()))
+
+    def run():
+        for level in levels: tree.find_by_level(level)
+    return run
+
+
+@benchmark('tree.subtree_sum', 'tree', scaled=True)
+def tree_subtree_sum(scale):
+    tree = synthetic.scaled_tree(scale)
+    roots = tree.roots
+
+    def run():
+        for root in roots: tree.subtree_sum(root)
+    return run
+
+
+def _build_df_at_level(level: int):
+    def setup(scale):
+        main = app()
+        tree = synthetic.scaled_tree(scale)
+        categories = tree.find_by_level(level)
+
+        def run():
+            with tree_of(main, tree):
+                main.build_category_df__from_categories(categories, 'Total')
+        return run
+    return setup
+
+
+for _level in range(3):
+    benchmark(f'df.build_level{_level}', 'df', scaled=True)(_build_df_at_level(_level))
+
+
+@benchmark('estimate.cube_build', 'estimate')
+def cube_build():
+    main = app()
+    bynum, byhouse, byincome, _ = main.load_data()
+    return lambda: EstimateCube(byincome, bynum, byhouse)
+
+
+@benchmark('estimate.page_pipeline', 'estimate')
+def page_pipeline():
+    """What the Personal Expenditure page computes for a profile: the estimate, a few edits, the forecasts"""
+    cube: EstimateCube = app().load_estimate_cube()
+    profiles = [(q, s, d) for q in range(len(cube.income_quintiles)) for s in range(len(cube.household_sizes)) for d in range(len(cube.dwellings))]
+    edits = {'0:2': 300.0, '3:2': 0.0, '7:2': 120.5}
+
+    def run():
+        for i, profile in enumerate(profiles):
+            model = SpendingModel(profile, cube.estimate(*profile), household_member_count(cube.household_sizes[profile[1]]))
+            model.apply_edits(edits, column=2)
+            model.forecast_factors = cube.forecaster.scale_factors(cube.age_groups[i % len(cube.age_groups)], 20)
+            model.household_total, model.forecast_totals
+    return run
+
+
+@benchmark('similarity.nearest', 'similarity')
+def similarity_nearest():
+    """The closest profiles and largest deviations for one edited table, as the Personal Expenditure page shows them"""
+    index = ProfileIndex(app().load_estimate_cube())
+    spending = index.vectors[0] * np.linspace(0.5, 1.5, len(index.categories))
+
+    def run():
+        nearest = index.nearest(spending, k=3)
+        index.deviations(spending, nearest.index[0])
+    return run
+
+
+@benchmark('similarity.batch', 'similarity', scaled=True)
+def similarity_batch(scale):
+    """Closest profile to each of 100 * scale spending vectors"""
+    index = ProfileIndex(app().load_estimate_cube())
+    vectors = np.random.default_rng(0).uniform(0, 500, (100 * scale, len(index.categories)))
+    return lambda: index.nearest_batch(vectors, k=3)
+
+
+def _export(table: str, fmt: str):
+    def setup():
+        main = app()
+        compiled, cube = main.load_dataset(), main.load_estimate_cube()
+        return lambda: export.export_bytes(table, fmt, compiled, cube)
+    return setup
+
+
+for _table in export.TABLES:
+    for _fmt in export.FORMATS:
+        benchmark(f'export.{_table}_{_fmt}', 'export')(_export(_table, _fmt))
@@ -0,0 +1,131 @@
+"""Headless sessions of main.py, for timing whole reruns.
+
+Streamlit's `AppTest` only arrived in 1.28 and cannot drive custom components such as AgGrid, so a
+session is driven through `LocalScriptRunner`, the script runner the testing tools are built on: each
+rerun gets the session state of the previous one and the widget values the browser would send back.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from unittest.mock import MagicMock
+
+from streamlit import config, source_util
+from streamlit.proto.WidgetStates_pb2 import WidgetState, WidgetStates
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner import RerunData
+from streamlit.testing.local_script_runner import LocalScriptRunner
+
+APP = Path(__file__).parent.parent / 'main.py'
+
+_runtime_ready = False
+
+
+def _setup_runtime():
+    """The parts of the Streamlit runtime a script run needs, once per process"""
+    global _runtime_ready
+    if _runtime_ready: return
+    config.set_option('runner.postScriptGC', False)
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage('/mock/media'))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    with source_util._pages_cache_lock:
+        source_util._cached_pages = None
+    _runtime_ready = True
+
+
+class ScriptError(Exception):
+    pass
+
+
+class Session:
+    """One browser session: keeps the widget values and session state between reruns"""
+
+    def __init__(self, script: Path = APP):
+        _setup_runtime()
+        self.script = str(script)
+        self.session_state = None
+        self.widgets: Dict[str, WidgetState] = {}
+        self.elements: List[Tuple[str, object]] = []
+        self.bytes_sent = 0
+
+    def rerun(self) -> List[Tuple[str, object]]:
+        runner = LocalScriptRunner(self.script, self.session_state)
+        states = WidgetStates()
+        states.widgets.extend(self.widgets.values())
+        runner.request_rerun(RerunData(widget_states=states))
+        runner.start()
+        runner.join()
+        self.session_state = runner.session_state
+        for data in runner.event_data:
+            if data.get('exception') is not None:
+                raise ScriptError(f'{type(data["exception"]).__name__}: {data["exception"]}')
+
+        self.elements, self.bytes_sent = [], 0
+        for msg in runner.forward_msgs():
+            self.bytes_sent += msg.ByteSize()
+            if msg.HasField('delta') and msg.delta.HasField('new_element'):
+                element = msg.delta.new_element
+                kind = element.WhichOneof('type')
+                if kind == 'exception':
+                    raise ScriptError(element.exception.message)
+                self.elements.append((kind, getattr(element, kind)))
+
+        # as in the browser, the next rerun only sends back the widgets this one drew, and buttons only fire
+        # on the rerun they were clicked for
+        rendered = {getattr(e, 'id', '') for _, e in self.elements}
+        self.widgets = {k: v for k, v in self.widgets.items() if k in rendered and not v.HasField('trigger_value')}
+        return self.elements
+
+    def find(self, kind: str, label: Optional[str] = None, index: int = 0):
+        matches = [e for k, e in self.elements if k == kind and (label is None or getattr(e, 'label', None) == label)]
+        if len(matches) <= index:
+            raise LookupError(f'No {kind} {label or ""} #{index} on the page')
+        return matches[index]
+
+    def _set(self, widget_id: str, **value) -> "Session":
+        state = WidgetState(id=widget_id)
+        for field, v in value.items(): setattr(state, field, v)
+        self.widgets[widget_id] = state
+        return self
+
+    def click(self, label: str) -> "Session":
+        return self._set(self.find('button', label).id, trigger_value=True)
+
+    def check(self, label: str, value: bool = True) -> "Session":
+        return self._set(self.find('checkbox', label).id, bool_value=value)
+
+    def select(self, label: str, option: str) -> "Session":
+        widget = self.find('selectbox', label)
+        return self._set(widget.id, int_value=list(widget.options).index(option))
+
+    def slide(self, label: str, value: float) -> "Session":
+        state = WidgetState(id=self.find('slider', label).id)
+        state.double_array_value.data.append(value)
+        self.widgets[state.id] = state
+        return self
+
+    def edit(self, index: int, edited_cells: Dict[str, float]) -> "Session":
+        """Edits the `index`th data editor; cells are keyed 'row:column' as the editor reports them"""
+        widget = self.find('arrow_data_frame', index=index)
+        return self._set(widget.id, string_value=json.dumps({'edited_cells': edited_cells, 'added_rows': [], 'deleted_rows': []}))
+
+    def grids(self) -> List[object]:
+        return [e for k, e in self.elements if k == 'component_instance']
+
+    def grid_rows(self, index: int) -> List[dict]:
+        return json.loads(json.loads(self.grids()[index].json_args)['row_data'])
+
+    def select_grid_row(self, index: int, category: str) -> "Session":
+        """Selects the row for `category` in the `index`th AgGrid, as a click in the browser would"""
+        grid = self.grids()[index]
+        args = json.loads(grid.json_args)
+        rows = json.loads(args['row_data'])
+        selected = [i for i in rows if i['Category'] == category]
+        if not selected:
+            raise LookupError(f'No row {category!r} in grid #{index}')
+        value = {'rowData': rows, 'originalDtypes': args['frame_dtypes'], 'selectedItems': selected, 'colState': None, 'ExcelBlob': None}
+        return self._set(grid.id, json_value=json.dumps(value))
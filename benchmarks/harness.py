@@ -0,0 +1,127 @@
+"""Registry, timer and result files shared by the benchmark modules"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# a benchmark is a setup function returning the callable to time; setup cost is not measured
+Setup = Callable[..., Callable[[], object]]
+
+# scale factors applied to the category hierarchy by the synthetic datasets, 1 being the real data
+SCALES = (1, 10, 100, 1000)
+
+
+@dataclass
+class Benchmark:
+    name: str
+    group: str
+    setup: Setup
+    scaled: bool
+    # the callable returns its own duration in seconds (e.g. one measured in a subprocess) instead of being timed
+    self_timed: bool = False
+
+    def cases(self, scales: Sequence[int]) -> List[Tuple[str, Callable[[], Callable[[], object]]]]:
+        if not self.scaled: return [(self.name, self.setup)]
+        return [(f'{self.name}[x{scale}]', lambda scale=scale: self.setup(scale)) for scale in scales]
+
+
+@dataclass
+class Result:
+    group: str
+    min: float
+    median: float
+    mean: float
+    stdev: float
+    repeat: int
+    number: int
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, group: str, scaled: bool = False, self_timed: bool = False):
+    """Registers a setup function; scaled benchmarks are called with each scale factor"""
+    def decorator(setup: Setup) -> Setup:
+        BENCHMARKS.append(Benchmark(name, group, setup, scaled, self_timed))
+        return setup
+    return decorator
+
+
+def measure(fn: Callable[[], object], repeat: int = 7, min_time: float = 0.1, max_time: float = 10.0,
+            self_timed: bool = False) -> Tuple[List[float], int]:
+    """Seconds per call over `repeat` rounds, each round running `fn` enough times to take at least `min_time`.
+
+    Slow calls get fewer rounds (at least three) so a single benchmark stays near `max_time`. A `self_timed`
+    call returns its own duration, e.g. one measured in a subprocess, and is run once per round.
+    """
+    if self_timed:
+        timings = [float(fn()) for _ in range(max(3, repeat))]
+        return timings, 1
+
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+    number = max(1, int(min_time / first)) if first > 0 else 1000
+    repeat = max(3, min(repeat, int(max_time / max(first * number, 1e-9))))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number): fn()
+        timings.append((time.perf_counter() - start) / number)
+    return timings, number
+
+
+def run(benchmarks: Sequence[Benchmark], scales: Sequence[int] = SCALES, repeat: int = 7,
+        report: Optional[Callable[[str, Result], None]] = None) -> Dict[str, Result]:
+    results = {}
+    for bench in benchmarks:
+        for name, setup in bench.cases(scales):
+            timings, number = measure(setup(), repeat=repeat, self_timed=bench.self_timed)
+            results[name] = Result(
+                bench.group, min(timings), statistics.median(timings), statistics.fmean(timings),
+                statistics.stdev(timings) if len(timings) > 1 else 0.0, len(timings), number,
+            )
+            if report: report(name, results[name])
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(results: Dict[str, Result], path: Path):
+    meta = {
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    path.write_text(json.dumps({'meta': meta, 'results': {k: asdict(v) for k, v in results.items()}}, indent=2))
+
+
+def load(path: Path) -> Dict[str, Result]:
+    return {k: Result(**v) for k, v in json.loads(path.read_text())['results'].items()}
+
+
+def compare(base: Dict[str, Result], new: Dict[str, Result], stat: str = 'median') -> List[Tuple[str, float, float, float]]:
+    """(name, base seconds, new seconds, relative change) for every benchmark present in both runs"""
+    rows = []
+    for name in base.keys() & new.keys():
+        before, after = getattr(base[name], stat), getattr(new[name], stat)
+        rows.append((name, before, after, after / before - 1 if before else 0.0))
+    return sorted(rows)
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale: return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
@@ -0,0 +1,190 @@
+"""Many simultaneous sessions in one process, as a Streamlit server would run them.
+
+Each virtual user is a `Session` on its own thread (the server also gives every session its own script
+thread) replaying one of the `SCENARIOS` in a loop until the time is up. For each number of users the
+report gives the rerun latency percentiles, the reruns per second the process managed, and how much
+memory the sessions hold: resident memory growth and the pickled size of each session's state.
+"""
+import gc
+import json
+import os
+import pickle
+import random
+import statistics
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from streamlit import type_util
+
+from benchmarks.driver import ScriptError, Session
+
+# a scenario step changes some widgets and triggers the rerun the browser would
+Step = Callable[[Session, random.Random], None]
+
+
+def _go_to(page: str) -> Step:
+    return lambda session, rng: session.click(page).rerun()
+
+
+def _edit_amount(session: Session, rng: random.Random):
+    rows = len(type_util.bytes_to_data_frame(session.find('arrow_data_frame').data))
+    session.edit(0, {f'{rng.randrange(rows)}:2': round(rng.uniform(0, 1000), 2)}).rerun()
+
+
+def _change_profile(session: Session, rng: random.Random):
+    label = rng.choice(['Your House', 'Your Age Group', 'Your Individual Income Level (after CPF)'])
+    session.select(label, rng.choice(list(session.find('selectbox', label).options))).rerun()
+
+
+def _forecast(session: Session, rng: random.Random):
+    session.slide('Forecast how many years ahead', float(rng.randint(5, 40))).rerun()
+
+
+def _open_categories(session: Session, rng: random.Random):
+    session.check('View Expenditure by Category').rerun()
+
+
+def _drill_down(session: Session, rng: random.Random):
+    """Selects a category with subcategories in the deepest grid shown, or starts over from the top grid"""
+    depth = len(session.grids()) - 1
+    expandable = [i['Category'] for i in session.grid_rows(depth) if i['More details'] == 'Yes']
+    if not expandable: depth, expandable = 0, [i['Category'] for i in session.grid_rows(0) if i['More details'] == 'Yes']
+    session.select_grid_row(depth, rng.choice(expandable)).rerun()
+
+
+def _change_age_group(session: Session, rng: random.Random):
+    label = 'Age Group of Main Income Earner'
+    session.select(label, rng.choice(list(session.find('selectbox', label).options))).rerun()
+
+
+SCENARIOS: Dict[str, List[Step]] = {
+    # reads the home page, then looks at both tools
+    'browse': [_go_to('Personal Expenditure'), _go_to('Household Expenditure'), _open_categories, _drill_down, _go_to('Home Page')],
+    # fills in the Personal Expenditure page
+    'edit': [_go_to('Personal Expenditure'), _change_profile, _edit_amount, _edit_amount, _forecast, _edit_amount, _change_profile],
+    # explores the category hierarchy
+    'drill': [_go_to('Household Expenditure'), _open_categories, _drill_down, _drill_down, _change_age_group, _drill_down, _drill_down],
+}
+
+
+@dataclass
+class LoadResult:
+    sessions: int
+    reruns: int
+    errors: int
+    seconds: float
+    throughput: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+    rss_mb: Optional[float]
+    rss_per_session_kb: Optional[float]
+    state_per_session_kb: Optional[float]
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _state_size(session: Session) -> Optional[int]:
+    try:
+        return len(pickle.dumps(dict(session.session_state.filtered_state)))
+    except Exception:
+        return None
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    if len(values) < 2: return values[0] if values else float('nan')
+    return statistics.quantiles(values, n=100, method='inclusive')[int(q) - 1]
+
+
+def _user(session: Session, steps: List[Step], seed: int, deadline: float, latencies: List[float], errors: List[BaseException]):
+    rng = random.Random(seed)
+    try:
+        session.rerun()
+        while time.perf_counter() < deadline:
+            for step in steps:
+                if time.perf_counter() >= deadline: break
+                start = time.perf_counter()
+                try:
+                    step(session, rng)
+                except (LookupError, ScriptError) as e:
+                    # an exception in the app, or the page was not in the state the step expected: start the scenario over
+                    errors.append(e)
+                    session.rerun()
+                    break
+                latencies.append(time.perf_counter() - start)
+    except Exception as e:
+        errors.append(e)
+
+
+def run_load(sessions: int, duration: float, scenarios: Sequence[str] = tuple(SCENARIOS), seed: int = 0) -> LoadResult:
+    """`sessions` users replaying `scenarios` (assigned round-robin) for `duration` seconds"""
+    gc.collect()
+    rss_before = _rss_bytes()
+    users = [Session() for _ in range(sessions)]
+    latencies: List[List[float]] = [[] for _ in users]
+    errors: List[BaseException] = []
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=_user, args=(user, SCENARIOS[scenarios[i % len(scenarios)]], seed + i, start + duration, latencies[i], errors))
+        for i, user in enumerate(users)
+    ]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    rss_after = _rss_bytes()
+    state_sizes = [i for i in (_state_size(user) for user in users) if i is not None]
+    all_latencies = sorted(i * 1e3 for session_latencies in latencies for i in session_latencies)
+    return LoadResult(
+        sessions=sessions,
+        reruns=len(all_latencies),
+        errors=len(errors),
+        seconds=elapsed,
+        throughput=len(all_latencies) / elapsed,
+        p50_ms=_percentile(all_latencies, 50),
+        p90_ms=_percentile(all_latencies, 90),
+        p99_ms=_percentile(all_latencies, 99),
+        max_ms=all_latencies[-1] if all_latencies else float('nan'),
+        rss_mb=rss_after / 2**20 if rss_after is not None else None,
+        rss_per_session_kb=(rss_after - rss_before) / sessions / 1024 if rss_after is not None and rss_before is not None else None,
+        state_per_session_kb=statistics.fmean(state_sizes) / 1024 if state_sizes else None,
+    )
+
+
+def warm_up(scenarios: Sequence[str] = tuple(SCENARIOS)):
+    """One user through every scenario, so the shared caches and lazy imports are not billed to the first sessions measured"""
+    for i, scenario in enumerate(scenarios):
+        session = Session()
+        session.rerun()
+        rng = random.Random(i)
+        for step in SCENARIOS[scenario]:
+            try:
+                step(session, rng)
+            except (LookupError, ScriptError):
+                break
+
+
+def run_ramp(session_counts: Sequence[int], duration: float, scenarios: Sequence[str] = tuple(SCENARIOS),
+             report: Optional[Callable[[LoadResult], None]] = None) -> List[LoadResult]:
+    warm_up(scenarios)
+    results = []
+    for sessions in session_counts:
+        results.append(run_load(sessions, duration, scenarios))
+        if report: report(results[-1])
+    return results
+
+
+def save(results: Sequence[LoadResult], path: Path):
+    path.write_text(json.dumps([asdict(i) for i in results], indent=2))
@@ -0,0 +1,64 @@
+"""Cold start: time to first paint of a page in a fresh process, and which imports the first rerun pays for"""
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.harness import benchmark
+
+ROOT = Path(__file__).parent.parent
+MARKER = '-- first rerun --'
+
+# what a visitor does to reach each page from a fresh session
+PAGES = {
+    'home':      [],
+    'personal':  ['Personal Expenditure'],
+    'household': ['Household Expenditure'],
+}
+
+_CHILD = '''
+import sys, time
+from benchmarks.driver import Session
+session = Session()
+sys.stderr.write({marker!r} + "\\n")
+start = time.perf_counter()
+session.rerun()
+for button in {clicks!r}:
+    session.click(button).rerun()
+print(time.perf_counter() - start)
+'''
+
+
+def _child_code(page: str) -> str:
+    return _CHILD.format(marker=MARKER, clicks=PAGES[page])
+
+
+def first_paint(page: str) -> float:
+    """Seconds a fresh process takes to render `page`, from its first rerun; importing Streamlit itself is not counted"""
+    result = subprocess.run([sys.executable, '-c', _child_code(page)], cwd=ROOT, check=True, capture_output=True, text=True)
+    return float(result.stdout.split()[-1])
+
+
+for _page in PAGES:
+    benchmark(f'startup.first_paint_{_page}', 'startup', self_timed=True)(lambda page=_page: lambda: first_paint(page))
+
+
+def import_report(page: str = 'home') -> List[Tuple[str, float, float]]:
+    """(top-level package, cumulative ms, self ms) of the modules first imported while rendering `page`, slowest first"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _child_code(page)], cwd=ROOT, check=True, capture_output=True, text=True)
+    lines = result.stderr.splitlines()
+    lines = lines[lines.index(MARKER) + 1:]
+
+    cumulative: Dict[str, float] = defaultdict(float)
+    own: Dict[str, float] = defaultdict(float)
+    for line in lines:
+        match_obj = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)', line)
+        if not match_obj: continue
+        self_us, cumulative_us, indent, module = match_obj.groups()
+        package = module.split('.')[0]
+        own[package] += int(self_us) / 1e3
+        # only outermost imports, nested ones are already part of their importer's cumulative time
+        if len(indent) == 1: cumulative[package] += int(cumulative_us) / 1e3
+    return sorted(((i, cumulative[i], own[i]) for i in own), key=lambda i: -i[1])
@@ -0,0 +1,46 @@
+"""Scaled copies of the real dataset, to see how the hierarchy code grows with the number of categories"""
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+
+from Categories import Category, CategoryTree
+import dataset
+
+
+@lru_cache(maxsize=1)
+def base_dataset() -> dataset.Dataset:
+    return dataset.load()
+
+
+@lru_cache(maxsize=None)
+def scaled_dataset(scale: int, seed: int = 0) -> dataset.Dataset:
+    """The expenditure hierarchy repeated `scale` times, each copy with its labels suffixed and its amounts perturbed.
+
+    The member tables are the real ones: the estimates do not depend on the hierarchy.
+    """
+    base = base_dataset()
+    if scale == 1: return base
+
+    n = len(base.category_names)
+    names: List[str] = []
+    for copy in range(scale):
+        names.extend(f'{name} #{copy}' if copy else name for name in base.category_names)
+    offsets = np.repeat(np.arange(scale, dtype=np.int32) * n, n)
+    parent_idx = np.tile(base.parent_idx, scale)
+    parent_idx = np.where(parent_idx >= 0, parent_idx + offsets, -1).astype(np.int32)
+
+    rng = np.random.default_rng(seed)
+    expenditure = np.tile(base.expenditure, (scale, 1)) * rng.uniform(0.5, 1.5, size=(scale * n, 1))
+    return dataset.Dataset(
+        names, np.tile(base.space_counts, scale), parent_idx, base.age_groups, expenditure.round(1), base.tables, base.sources,
+    )
+
+
+def scaled_categories(scale: int) -> List[Category]:
+    return dataset.build_categories(scaled_dataset(scale))
+
+
+def scaled_tree(scale: int) -> CategoryTree:
+    """Tree over a scaled copy, with the total rows left out as `load_category_tree` does"""
+    return CategoryTree(i for i in scaled_categories(scale) if 'total' not in i.name.lower())
@@ -0,0 +1,174 @@
+"""Charts of the Household Expenditure page, built once per dataset and kept serialized.
+
+`st.line_chart` builds an Altair chart on every call (around 17 ms for the age chart, and Altair is not
+safe to use from several script threads at once), and `st.vega_lite_chart` converts its data frame to
+Arrow on every call. The data behind these charts only changes with the dataset, so each chart is built
+once into the finished `ArrowVegaLiteChart` message and kept as its serialized bytes; drawing it is a
+parse of those bytes (around 12 us) and sending them.
+
+Building and sending a finished message goes through Streamlit internals (tested with 1.21). Where they
+are missing or no longer fit, charts are kept as their data and spec and drawn with `st.vega_lite_chart`.
+
+`HouseholdCharts` holds the age chart and one bar chart per (category, age group) a grid can show. The
+bar charts are built on first use and kept in an LRU cache of at most `MAX_CACHED_CHARTS` charts, which
+holds every chart of the real hierarchy; `warm` builds them all ahead of time.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Hashable, Iterable, Iterator, Optional, Tuple, Union
+
+import pandas as pd
+import streamlit as st
+
+from Categories import CategoryTree
+from constants import AGE_GROUPS
+
+try:
+    from streamlit.elements import arrow_vega_lite
+    from streamlit.proto.ArrowVegaLiteChart_pb2 import ArrowVegaLiteChart
+    _prebuilt = callable(getattr(arrow_vega_lite, 'marshall', None)) and callable(getattr(st._main, '_enqueue', None))
+except (ImportError, AttributeError):
+    _prebuilt = False
+
+log = logging.getLogger(__name__)
+
+MAX_CACHED_CHARTS = 4096
+
+# fixed specs, equivalent to what st.line_chart and st.bar_chart generate for these columns
+AGE_LINE_CHART_SPEC = {
+    'mark': 'line',
+    'encoding': {
+        'x': {'field': 'Age Group', 'type': 'nominal', 'title': 'Age Group', 'axis': {'grid': False}},
+        'y': {'field': 'Total Amount', 'type': 'quantitative', 'title': 'Total Amount'},
+        'tooltip': [{'field': 'Age Group', 'type': 'nominal'}, {'field': 'Total Amount', 'type': 'quantitative'}],
+    },
+    'selection': {'zoom': {'type': 'interval', 'bind': 'scales', 'encodings': ['x', 'y']}},
+}
+
+CATEGORY_BAR_CHART_SPEC = {
+    'mark': 'bar',
+    'encoding': {
+        'x': {'field': 'Category', 'type': 'nominal'},
+        'y': {'field': 'Amount', 'type': 'quantitative'},
+        'tooltip': [{'field': 'Category', 'type': 'nominal'}, {'field': 'Amount', 'type': 'quantitative'}],
+    },
+}
+
+FORECAST_LINE_CHART_SPEC = {
+    'mark': 'line',
+    'encoding': {
+        'x': {'field': 'Years from now', 'type': 'quantitative', 'title': 'Years from now', 'axis': {'grid': False}},
+        'y': {'field': 'Estimated Total', 'type': 'quantitative', 'title': 'Estimated Total'},
+        'tooltip': [{'field': 'Years from now', 'type': 'quantitative'}, {'field': 'Estimated Total', 'type': 'quantitative'}],
+    },
+    'selection': {'zoom': {'type': 'interval', 'bind': 'scales', 'encodings': ['x', 'y']}},
+}
+
+# the page shows the source's Total column as Average
+AGE_GROUP_COLUMNS: Dict[str, str] = {age_grp: 'Total' if age_grp == 'Average' else age_grp for age_grp in AGE_GROUPS}
+
+# a serialized chart message, or the data and spec to pass to st.vega_lite_chart
+Chart = Union[bytes, Tuple[pd.DataFrame, dict]]
+
+
+def serialize(data: pd.DataFrame, spec: dict) -> Chart:
+    global _prebuilt
+    if _prebuilt:
+        try:
+            proto = ArrowVegaLiteChart()
+            arrow_vega_lite.marshall(proto, data, spec, use_container_width=True)
+            return proto.SerializeToString()
+        except (TypeError, AttributeError) as e:
+            _prebuilt = False
+            log.warning(f'Could not prebuild charts with this Streamlit version, drawing them with st.vega_lite_chart: {e!r}')
+    return data, spec
+
+
+def draw(chart: Chart):
+    """Adds a chart where st.vega_lite_chart would (inside any active `with` container)"""
+    if isinstance(chart, bytes):
+        # the public chart functions have no way to take a finished message, so it is enqueued the way they do
+        return st._main._enqueue('arrow_vega_lite_chart', ArrowVegaLiteChart.FromString(chart))
+    data, spec = chart
+    return st.vega_lite_chart(data, spec, use_container_width=True)
+
+
+def _chart_nbytes(chart: Chart) -> int:
+    return len(chart) if isinstance(chart, bytes) else int(chart[0].memory_usage(deep=True).sum())
+
+
+class ChartCache:
+    """Serialized charts by key, built by `build` on first use; the least recently used go beyond `max_entries`"""
+
+    def __init__(self, build: Callable[[Hashable], Chart], max_entries: Optional[int] = MAX_CACHED_CHARTS):
+        self._build = build
+        self.max_entries = max_entries
+        self._charts: "OrderedDict[Hashable, Chart]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._charts)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._charts
+
+    def get(self, key: Hashable) -> Chart:
+        with self._lock:
+            chart = self._charts.get(key)
+            if chart is not None:
+                self._charts.move_to_end(key)
+                return chart
+        # built outside the lock; two reruns asking for the same new chart at once both build it
+        chart = self._build(key)
+        with self._lock:
+            self._charts[key] = chart
+            if self.max_entries is not None and len(self._charts) > self.max_entries:
+                self._charts.popitem(last=False)
+        return chart
+
+    def warm(self, keys: Iterable[Hashable]):
+        """Builds the charts for `keys` ahead of use, no more of them than the cache holds"""
+        for key in islice(keys, self.max_entries):
+            if key not in self._charts: self.get(key)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(_chart_nbytes(i) for i in self._charts.values())
+
+
+class HouseholdCharts:
+    """The charts of the Household Expenditure page for one category tree"""
+
+    def __init__(self, tree: CategoryTree, max_entries: Optional[int] = MAX_CACHED_CHARTS):
+        self.tree = tree
+        self.age_chart = serialize(self.spending_by_age(), AGE_LINE_CHART_SPEC)
+        self.category_charts = ChartCache(lambda key: serialize(self.category_amounts(*key), CATEGORY_BAR_CHART_SPEC), max_entries)
+
+    def spending_by_age(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'Age Group': AGE_GROUPS,
+            'Total Amount': [self.tree.root_total[self.tree.column(AGE_GROUP_COLUMNS[age_grp])] for age_grp in AGE_GROUPS],
+        })
+
+    def category_amounts(self, parent_idx: int, age_group: str) -> pd.DataFrame:
+        """Amounts of the children of a category (or of the top level when parent_idx is -1)"""
+        categories = self.tree.find_by_level(0) if parent_idx < 0 else self.tree.children_of(self.tree.nodes[parent_idx])
+        return pd.DataFrame({'Category': [i.name for i in categories], 'Amount': self.tree.values_of(categories, age_group)})
+
+    def category_chart(self, parent_idx: int, age_group: str) -> Chart:
+        return self.category_charts.get((parent_idx, age_group))
+
+    def grid_keys(self) -> Iterator[Tuple[int, str]]:
+        """(parent, age group) of every grid the page can show"""
+        parents = [-1] + [i for i, node in enumerate(self.tree.nodes) if self.tree.children_of(node)]
+        for age_group in dict.fromkeys(AGE_GROUP_COLUMNS.values()):
+            for parent_idx in parents: yield parent_idx, age_group
+
+    def warm(self):
+        self.category_charts.warm(self.grid_keys())
+
+    @property
+    def nbytes(self) -> int:
+        return _chart_nbytes(self.age_chart) + self.category_charts.nbytes
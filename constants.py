@@ -0,0 +1,45 @@
+AGE_GROUPS = ('Average',
+ 'Below 25',
+ '25 - 29',
+ '30 - 34',
+ '35 - 39',
+ '40 - 44',
+ '45 - 49',
+ '50 - 54',
+ '55 - 59',
+ '60 - 64',
+ '65 & Over'
+ )
+
+AGE_GRP_TO_SPENDING_MUL = {
+    'Average':  1.016276,
+    'Below 25': 0.846914,
+    '25 - 29':  0.924125,
+    '30 - 34': 1.043092,
+    '35 - 39': 1.121353,
+    '40 - 44': 1.22865,
+    '45 - 49': 1.16569,
+    '50 - 54': 1.17853,
+    '55 - 59': 0.996156,
+    '60 - 64': 0.832904,
+    '65 & Over': 0.646313,
+}
+
+INCOME_LEVEL_TO_QTILES = {
+  'Below 500'    :  0,
+  '500 - 999'    :  0,
+  '1,000 - 1,499':  1,
+  '1,500 - 1,999':   1,
+  '2,000 - 2,499':   2,
+  '2,500 - 2,999':   2,
+  '3,000 - 3,499':   2,
+  '3,500 - 3,999':   3,
+  '4,000 - 4,499':   3,
+  '4,500 - 4,999':   3,
+  '5,000 - 5,499':   3,
+  '5,500 - 5,999':   4,
+  '6,000 - 6,999':   4,
+  '7,000 - 7,999':   4,
+  '8,000 - 8,999':   4,
+  '9,000 & Over ':   4,
+}
@@ -0,0 +1,351 @@
+"""Compiles the SingStat source files into one binary dataset that the app can load without parsing.
+
+The artifact is laid out as
+
+    MAGIC | uint32 format version | uint32 header length | JSON header | array blocks
+
+The JSON header holds the string table (category names, age groups, table labels), the SHA-256 of
+every source file it was built from, and the dtype/shape/offset of each array block. Blocks are
+64-byte aligned so they can be viewed straight out of a memory map without copying.
+
+    python dataset.py build        # (re)compile the artifact from the CSV and Excel files
+    python dataset.py benchmark    # time compiling from source against loading the artifact
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from Categories import AgeGroupValues, Category, build_hierarchy
+
+log = logging.getLogger(__name__)
+
+cwd = Path(__file__).parent
+
+MAGIC = b'FWDS'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+EXPENDITURE_CSV = 'singstat-avg-household-exp.csv'
+MEMBER_TABLES = {
+    'bynum':    'per-household-member-bynum.xlsx',
+    'byhouse':  'per-household-member-bydwelling.xlsx',
+    'byincome': 'per-household-member-byincome.xlsx',
+}
+ARTIFACT = 'singstat-avg-household-exp.fwds'
+
+# SingStat notation for "nil or negligible or not significant"
+NIL = '-'
+
+
+class DatasetError(Exception):
+    pass
+
+
+@dataclass
+class MemberTable:
+    """One of the per-household-member tables: a row per type of goods and services, a column per group"""
+    row_labels: List[str]
+    columns: List[str]
+    values: np.ndarray
+
+    def to_frame(self, drop_totals: bool = False):
+        """The table as a DataFrame with the row labels in a 'Type of Goods and Services' column"""
+        import pandas as pd
+
+        # the numbers stay a view onto `values` (e.g. a shared memory segment) unless rows have to be picked out
+        df = pd.DataFrame(self.values, columns=self.columns, copy=False)
+        df.insert(0, 'Type of Goods and Services', self.row_labels)
+        if drop_totals:
+            keep = np.flatnonzero(['total' not in i.lower() for i in self.row_labels])
+            if len(keep) and keep[-1] - keep[0] + 1 == len(keep):
+                df = df.iloc[keep[0]:keep[-1] + 1]
+            else:
+                df = df.iloc[keep]
+        return df
+
+
+@dataclass
+class Dataset:
+    category_names: List[str]
+    space_counts: np.ndarray
+    parent_idx: np.ndarray
+    age_groups: List[str]
+    expenditure: np.ndarray
+    tables: Dict[str, MemberTable]
+    sources: Dict[str, str]
+
+
+def _to_float(value) -> float:
+    if value is None or value == '': return np.nan
+    if isinstance(value, str):
+        value = value.strip()
+        if value == NIL: return 0.0
+        return float(value.replace(',', ''))
+    return float(value)
+
+
+def _iter_expenditure_rows(path: Path) -> Iterator[Tuple[int, str, List[str]]]:
+    """Yields (space_count, name, raw values) for every category row of the SingStat CSV export.
+
+    The export starts with a units line and two header lines, and the data is followed by a
+    blank line and the table's notes, which are skipped.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if row and row[0].strip() == 'Type of Goods and Services': break
+        next(reader)  # second header line: the age groups under "Age Group of Main Income Earner"
+
+        for row in reader:
+            if not row or not row[0].strip(): break
+            raw_name = row[0]
+            name = raw_name.lstrip(' ')
+            yield len(raw_name) - len(name), name.strip(), row[1:]
+
+
+def _read_age_groups(path: Path) -> List[str]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if row and row[0].strip() == 'Type of Goods and Services':
+                return [row[1].strip()] + [i.strip() for i in next(reader)[2:] if i.strip()]
+    raise DatasetError(f'{path.name} has no "Type of Goods and Services" header')
+
+
+def parse_expenditure_csv(path: Path) -> Tuple[List[str], np.ndarray, np.ndarray, List[str], np.ndarray]:
+    """Single pass over the indentation-encoded CSV.
+
+    Every two leading spaces is one level deeper in the hierarchy (the same `space_count // 2` rule as
+    `Category.level`); a row's parent is the closest preceding row at a shallower level.
+    """
+    age_groups = _read_age_groups(path)
+    names: List[str] = []
+    space_counts: List[int] = []
+    parents: List[int] = []
+    rows: List[List[float]] = []
+    open_levels: List[Tuple[int, int]] = []  # (level, row index) of the current ancestors
+
+    for space_count, name, raw_values in _iter_expenditure_rows(path):
+        level = space_count // 2
+        while open_levels and open_levels[-1][0] >= level: open_levels.pop()
+
+        parents.append(open_levels[-1][1] if open_levels else -1)
+        open_levels.append((level, len(names)))
+        names.append(name)
+        space_counts.append(space_count)
+        rows.append([_to_float(i) for i in raw_values[:len(age_groups)]])
+
+    return (
+        names,
+        np.array(space_counts, dtype=np.int32),
+        np.array(parents, dtype=np.int32),
+        age_groups,
+        np.array(rows, dtype=np.float64).reshape(len(names), len(age_groups)),
+    )
+
+
+def parse_member_table(path: Path) -> MemberTable:
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows)
+        columns = [str(i).strip() for i in header[1:] if i is not None]
+        row_labels, values = [], []
+        for row in rows:
+            if row[0] is None: continue
+            row_labels.append(str(row[0]).strip())
+            values.append([_to_float(i) for i in row[1:len(columns) + 1]])
+    finally:
+        workbook.close()
+    return MemberTable(row_labels, columns, np.array(values, dtype=np.float64).reshape(len(row_labels), len(columns)))
+
+
+def _source_paths(source_dir: Path) -> Dict[str, Path]:
+    return {name: source_dir / name for name in (EXPENDITURE_CSV, *MEMBER_TABLES.values())}
+
+
+def hash_sources(source_dir: Path = cwd) -> Dict[str, str]:
+    return {name: hashlib.sha256(path.read_bytes()).hexdigest() for name, path in _source_paths(source_dir).items()}
+
+
+def compile_sources(source_dir: Path = cwd) -> Dataset:
+    names, space_counts, parents, age_groups, expenditure = parse_expenditure_csv(source_dir / EXPENDITURE_CSV)
+    tables = {key: parse_member_table(source_dir / filename) for key, filename in MEMBER_TABLES.items()}
+    return Dataset(names, space_counts, parents, age_groups, expenditure, tables, hash_sources(source_dir))
+
+
+def artifact_bytes(dataset: Dataset) -> bytes:
+    """The dataset serialized in the artifact layout"""
+    arrays = {
+        'space_counts': dataset.space_counts,
+        'parent_idx': dataset.parent_idx,
+        'expenditure': dataset.expenditure,
+        **{f'{key}.values': table.values for key, table in dataset.tables.items()},
+    }
+    strings = {
+        'category_names': dataset.category_names,
+        'age_groups': dataset.age_groups,
+        **{f'{key}.row_labels': table.row_labels for key, table in dataset.tables.items()},
+        **{f'{key}.columns': table.columns for key, table in dataset.tables.items()},
+    }
+
+    def build_header(data_start: int) -> bytes:
+        offset, layout = data_start, {}
+        for name, array in arrays.items():
+            layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        return json.dumps({'sources': dataset.sources, 'strings': strings, 'arrays': layout}).encode()
+
+    # offsets depend on the header length, so size the header once and pad it to the next aligned boundary
+    prefix_len = len(MAGIC) + 8
+    data_start = -(-(prefix_len + len(build_header(0)) + 64) // ALIGNMENT) * ALIGNMENT
+    header = build_header(data_start).ljust(data_start - prefix_len, b' ')
+
+    parts = [MAGIC + struct.pack('<II', FORMAT_VERSION, len(header)) + header]
+    for array in arrays.values():
+        data = np.ascontiguousarray(array).tobytes()
+        parts.append(data.ljust(-(-len(data) // ALIGNMENT) * ALIGNMENT, b'\0'))
+    return b''.join(parts)
+
+
+def write_artifact(dataset: Dataset, path: Path) -> None:
+    # a temporary file of its own, as several processes may rebuild a stale artifact at the same time
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name + '.', suffix='.tmp', dir=path.parent)
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(artifact_bytes(dataset))
+        tmp_path.replace(path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def read_buffer(buffer: np.ndarray, name: str) -> Dataset:
+    """Dataset whose arrays are read-only views onto `buffer`, a uint8 array holding an artifact"""
+    prefix_len = len(MAGIC) + 8
+    if len(buffer) < prefix_len or bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise DatasetError(f'{name} is not a dataset artifact')
+    version, header_len = struct.unpack('<II', bytes(buffer[len(MAGIC):prefix_len]))
+    if version != FORMAT_VERSION:
+        raise DatasetError(f'{name} has format version {version}, expected {FORMAT_VERSION}')
+    if prefix_len + header_len > len(buffer):
+        raise DatasetError(f'{name} is truncated')
+
+    # a truncated or corrupted file is reported like any other unusable artifact, so that it is rebuilt
+    try:
+        header = json.loads(bytes(buffer[prefix_len:prefix_len + header_len]))
+        arrays = {}
+        for array_name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'], dtype=np.int64))
+            start, end = int(spec['offset']), int(spec['offset']) + count * dtype.itemsize
+            if not prefix_len + header_len <= start <= end <= len(buffer):
+                raise DatasetError(f'{name} is truncated, {array_name} does not fit')
+            array = buffer[start:end].view(dtype).reshape(spec['shape'])
+            array.flags.writeable = False
+            arrays[array_name] = array
+
+        strings = header['strings']
+        tables = {
+            key: MemberTable(strings[f'{key}.row_labels'], strings[f'{key}.columns'], arrays[f'{key}.values'])
+            for key in MEMBER_TABLES
+        }
+        return Dataset(
+            strings['category_names'], arrays['space_counts'], arrays['parent_idx'],
+            strings['age_groups'], arrays['expenditure'], tables, header['sources'],
+        )
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise DatasetError(f'{name} is corrupted: {e!r}') from None
+
+
+def read_artifact(path: Path) -> Dataset:
+    """Memory-maps the artifact; every array in the returned Dataset is a read-only view onto the file"""
+    try:
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    except ValueError:
+        # numpy cannot map an empty file
+        raise DatasetError(f'{path.name} is empty') from None
+    return read_buffer(buffer, path.name)
+
+
+def build_categories(dataset: Dataset) -> List[Category]:
+    """Category objects for every row of the expenditure table, in file order; their values are views onto its rows"""
+    columns = {age_grp: i for i, age_grp in enumerate(dataset.age_groups)}
+    return build_hierarchy(
+        (name, space_count, parent_idx, AgeGroupValues(row, columns))
+        for name, space_count, parent_idx, row in zip(dataset.category_names, dataset.space_counts.tolist(),
+                                                      dataset.parent_idx.tolist(), dataset.expenditure)
+    )
+
+
+def load(source_dir: Path = cwd, artifact: Optional[Path] = None) -> Dataset:
+    """Loads the compiled dataset, rebuilding it first if it is missing, outdated or built from other sources.
+
+    Without the source files (e.g. a deployment shipping only the artifact) a readable artifact is used as is.
+    """
+    artifact = artifact or source_dir / ARTIFACT
+    have_sources = all(i.exists() for i in _source_paths(source_dir).values())
+    if artifact.exists():
+        try:
+            dataset = read_artifact(artifact)
+            if not have_sources or dataset.sources == hash_sources(source_dir): return dataset
+            log.info(f'{artifact.name} was built from different source files, rebuilding')
+        except DatasetError as e:
+            if not have_sources: raise
+            log.info(f'{e}, rebuilding')
+
+    dataset = compile_sources(source_dir)
+    try:
+        write_artifact(dataset, artifact)
+    except OSError as e:
+        log.warning(f'Could not write {artifact.name}: {e}')
+        return dataset
+    return read_artifact(artifact)
+
+
+def benchmark(repeat: int = 20) -> Dict[str, float]:
+    def best_of(fn) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    return {
+        'compile_sources_ms': best_of(compile_sources) * 1e3,
+        'load_artifact_ms':   best_of(load) * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('build', 'benchmark'))
+    parser.add_argument('--source-dir', type=Path, default=cwd)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        artifact = args.source_dir / ARTIFACT
+        write_artifact(compile_sources(args.source_dir), artifact)
+        print(f'Wrote {artifact} ({artifact.stat().st_size} bytes)')
+    else:
+        for name, ms in benchmark().items():
+            print(f'{name:<20} {ms:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
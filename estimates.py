@@ -0,0 +1,289 @@
+"""Spending estimates for household profiles, shared by the Personal Expenditure page and batch scoring.
+
+    python estimates.py profiles.csv estimates.parquet --workers 4
+"""
+import argparse
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Deque, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from constants import AGE_GROUPS, INCOME_LEVEL_TO_QTILES
+import dataset
+from forecast import Forecaster
+import shared_data
+
+log = logging.getLogger(__name__)
+
+PROFILE_COLUMNS = ('income', 'household_size', 'dwelling', 'age_group')
+FORECAST_HORIZONS = (5, 10, 20)
+
+
+class EstimateCube:
+    """Every estimate the Personal Expenditure page can show, computed once.
+
+    The page's estimate for a category is the mean of three per-household-member figures: the one for
+    the income quintile, the one for the household size and the one for the dwelling type. The cube
+    holds that mean for every (quintile, household size, dwelling, category) combination, so a page
+    render only slices it. The age group does not change the current estimate (it only drives the
+    forecasts), so the cube has no age axis.
+
+    Tables are expected in the shape returned by `load_data`: a 'Type of Goods and Services' column
+    followed by one column per group, with the total rows removed. For `byincome` the column after
+    the labels is the overall average and the quintiles follow it.
+    """
+
+    def __init__(self, byincome: pd.DataFrame, bynum: pd.DataFrame, byhouse: pd.DataFrame, forecaster: Optional[Forecaster] = None):
+        self.categories: List[str] = list(byincome['Type of Goods and Services'])
+        self.income_quintiles: List[str] = list(byincome.columns[2:])
+        self.household_sizes: List[str] = list(bynum.columns[1:])
+        self.dwellings: List[str] = list(byhouse.columns[1:])
+        self.age_groups = AGE_GROUPS
+        self.forecaster = forecaster or Forecaster()
+
+        # (group, category) arrays, one per source table
+        self.by_income = byincome.iloc[:, 2:].to_numpy(dtype=np.float64).T.copy()
+        self.by_household_size = bynum.iloc[:, 1:].to_numpy(dtype=np.float64).T.copy()
+        self.by_dwelling = byhouse.iloc[:, 1:].to_numpy(dtype=np.float64).T.copy()
+
+        self.estimates = (
+            (self.by_income[:, None, None, :] + self.by_household_size[None, :, None, :] + self.by_dwelling[None, None, :, :]) / 3
+        ).round(2)
+        self.totals = self.estimates.sum(axis=-1)
+        for array in (self.by_income, self.by_household_size, self.by_dwelling, self.estimates, self.totals):
+            array.flags.writeable = False
+
+    @property
+    def shape(self):
+        return self.estimates.shape
+
+    def household_size_index(self, household_size: str) -> int:
+        return self.household_sizes.index(household_size)
+
+    def dwelling_index(self, dwelling: str) -> int:
+        return self.dwellings.index(dwelling)
+
+    def estimate(self, qtile: int, household_size: int, dwelling: int) -> np.ndarray:
+        """Per-category estimate for one profile; arguments are indices along the cube's axes"""
+        return self.estimates[qtile, household_size, dwelling]
+
+    def total(self, qtile: int, household_size: int, dwelling: int) -> float:
+        return float(self.totals[qtile, household_size, dwelling])
+
+    def components(self, qtile: int, household_size: int, dwelling: int) -> np.ndarray:
+        """(category, 3) figures the estimate is the mean of: income quintile, household size, dwelling type"""
+        return np.stack([self.by_income[qtile], self.by_household_size[household_size], self.by_dwelling[dwelling]], axis=1)
+
+    @classmethod
+    def from_dataset(cls, compiled: dataset.Dataset) -> "EstimateCube":
+        tables = {key: table.to_frame(drop_totals=True) for key, table in compiled.tables.items()}
+        return cls(tables['byincome'], tables['bynum'], tables['byhouse'])
+
+
+def household_member_count(household_size: str) -> int:
+    """Number of people used for the household totals; groups that are not a plain number count as 3"""
+    try:
+        return int(household_size)
+    except ValueError:
+        return 3
+
+
+def load_cube(source_dir: Path = dataset.cwd) -> EstimateCube:
+    return EstimateCube.from_dataset(shared_data.load(source_dir))
+
+
+class BatchEstimator:
+    """Scores tables of household profiles with the same estimates the Personal Expenditure page shows.
+
+    A profile is a row with the columns in `PROFILE_COLUMNS`, holding the same labels the page offers:
+    an income level from `INCOME_LEVEL_TO_QTILES`, a household size and dwelling type from the cube, and
+    an age group. Rows with a label that is not recognised get NaN estimates.
+    """
+
+    def __init__(self, cube: EstimateCube, horizons: Sequence[int] = FORECAST_HORIZONS, include_categories: bool = False):
+        self.cube = cube
+        self.horizons = tuple(horizons)
+        self.include_categories = include_categories
+
+        self._income_codes = pd.Index([i.strip() for i in INCOME_LEVEL_TO_QTILES])
+        self._income_qtiles = np.array(list(INCOME_LEVEL_TO_QTILES.values()), dtype=np.intp)
+        self._household_codes = pd.Index(cube.household_sizes)
+        self._household_members = np.array([household_member_count(i) for i in cube.household_sizes], dtype=np.float64)
+        self._dwelling_codes = pd.Index(cube.dwellings)
+        self._age_codes = pd.Index(AGE_GROUPS)
+        # (age group, horizon) scale factors, NaN for 'Average' which has no age to forecast from
+        self._scale_factors = cube.forecaster.scale_factor_table(self.horizons, AGE_GROUPS)
+
+    @staticmethod
+    def _codes(index: pd.Index, values: pd.Series) -> np.ndarray:
+        return index.get_indexer(values.astype(str).str.strip())
+
+    def estimate(self, profiles: pd.DataFrame) -> pd.DataFrame:
+        missing = [i for i in PROFILE_COLUMNS if i not in profiles.columns]
+        if missing:
+            raise ValueError(f'Profiles are missing the columns {missing}')
+
+        income = self._codes(self._income_codes, profiles['income'])
+        household = self._codes(self._household_codes, profiles['household_size'])
+        dwelling = self._codes(self._dwelling_codes, profiles['dwelling'])
+        age = self._codes(self._age_codes, profiles['age_group'])
+        valid = (income >= 0) & (household >= 0) & (dwelling >= 0) & (age >= 0)
+        if not valid.all():
+            log.warning(f'{(~valid).sum()} of {len(valid)} profiles have unrecognised labels')
+
+        qtile = np.where(valid, self._income_qtiles[income], 0)
+        household, dwelling, age = (np.where(valid, i, 0) for i in (household, dwelling, age))
+
+        total = np.where(valid, self.cube.totals[qtile, household, dwelling], np.nan)
+        members = self._household_members[household]
+
+        result = {
+            'estimated_total': total,
+            'estimated_household_total': total * members,
+        }
+        scale_factors = self._scale_factors[age]
+        for i, years in enumerate(self.horizons):
+            result[f'estimated_total_in_{years}_years'] = total * scale_factors[:, i]
+            result[f'estimated_household_total_in_{years}_years'] = total * scale_factors[:, i] * members
+        if self.include_categories:
+            per_category = self.cube.estimates[qtile, household, dwelling]
+            per_category[~valid] = np.nan
+            for i, category in enumerate(self.cube.categories):
+                result[f'estimate: {category}'] = per_category[:, i]
+
+        return pd.concat([profiles.reset_index(drop=True), pd.DataFrame(result)], axis=1)
+
+
+def read_profiles(path: Path, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Reads a CSV or Parquet file of profiles in chunks of at most `chunksize` rows"""
+    if file_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, dtype={'household_size': str})
+
+
+FILE_FORMATS = ('csv', 'parquet')
+
+
+def file_format(path: Path) -> str:
+    """'parquet' for a .parquet/.pq path, else 'csv'"""
+    return 'parquet' if path.suffix.lower() in ('.parquet', '.pq') else 'csv'
+
+
+class ResultWriter:
+    """Writes DataFrames one after another as one CSV or Parquet table, to a path or a binary stream.
+
+    The format defaults to the one the path's suffix names (CSV for a stream). Use as a context manager,
+    or call `close` to finish the table; a stream passed in is left open.
+    """
+
+    def __init__(self, sink: Union[Path, BinaryIO], fmt: Optional[str] = None):
+        fmt = fmt or (file_format(sink) if isinstance(sink, Path) else 'csv')
+        if fmt not in FILE_FORMATS:
+            raise ValueError(f'Unknown format {fmt!r}, expected one of {FILE_FORMATS}')
+        self.fmt = fmt
+        self._path = sink if isinstance(sink, Path) else None
+        # a path is only opened by the first write, so a run that fails before it leaves no empty file behind
+        self._sink: Optional[BinaryIO] = None if self._path else sink
+        self._parquet_writer = None
+        self.rows = 0
+
+    def write(self, df: pd.DataFrame):
+        if self._sink is None: self._sink = open(self._path, 'wb')
+        if self.fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self._sink, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            self._sink.write(df.to_csv(index=False, header=self.rows == 0).encode())
+        self.rows += len(df)
+
+    def close(self):
+        try:
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+        finally:
+            if self._path and self._sink is not None: self._sink.close()
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_worker_estimator: Optional[BatchEstimator] = None
+
+
+def _init_worker(source_dir: Path, horizons: Sequence[int], include_categories: bool):
+    global _worker_estimator
+    _worker_estimator = BatchEstimator(load_cube(source_dir), horizons, include_categories)
+
+
+def _estimate_in_worker(profiles: pd.DataFrame) -> pd.DataFrame:
+    return _worker_estimator.estimate(profiles)
+
+
+def estimate_file(
+    input_path: Path,
+    output_path: Path,
+    chunksize: int = 50_000,
+    workers: int = 1,
+    horizons: Sequence[int] = FORECAST_HORIZONS,
+    include_categories: bool = False,
+    source_dir: Path = dataset.cwd,
+) -> int:
+    """Streams `input_path` through the estimator into `output_path`, returning the number of profiles scored.
+
+    At most `2 * workers` chunks are held in memory at a time, and results are written in input order.
+    """
+    # loaded here first, so a stale artifact is rebuilt once rather than by every worker at the same time
+    cube = load_cube(source_dir)
+    with ResultWriter(output_path) as writer:
+        if workers <= 1:
+            estimator = BatchEstimator(cube, horizons, include_categories)
+            for chunk in read_profiles(input_path, chunksize):
+                writer.write(estimator.estimate(chunk))
+            return writer.rows
+
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(source_dir, tuple(horizons), include_categories)) as executor:
+            pending: Deque[Future] = deque()
+            for chunk in read_profiles(input_path, chunksize):
+                pending.append(executor.submit(_estimate_in_worker, chunk))
+                if len(pending) >= 2 * workers:
+                    writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+        return writer.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate monthly spending for a CSV or Parquet file of household profiles.')
+    parser.add_argument('input', type=Path, help=f'profiles with the columns {", ".join(PROFILE_COLUMNS)}')
+    parser.add_argument('output', type=Path, help='where to write the estimates (.csv or .parquet)')
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to score chunks in')
+    parser.add_argument('--horizons', type=int, nargs='+', default=list(FORECAST_HORIZONS), help='forecast horizons in years')
+    parser.add_argument('--categories', action='store_true', help='also write the estimate for every category')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(name)s-%(levelname)s|%(lineno)d:  %(message)s', level=logging.INFO)
+    start = time.perf_counter()
+    rows = estimate_file(args.input, args.output, args.chunksize, args.workers, args.horizons, args.categories)
+    log.info(f'Scored {rows} profiles in {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Bulk export of the category hierarchy and the estimate grid, as CSV or Parquet.
+
+Two tables can be exported:
+
+- 'hierarchy': every row of the expenditure table in file order, with its path of labels, its level,
+  its parent and one column per age group
+- 'estimates': the Personal Expenditure page's estimate for every (income level, household size,
+  dwelling type) it offers, per category and in total, in the layout `estimates.BatchEstimator` writes
+
+Both are generated as DataFrames of at most `CHUNK_ROWS` rows and written one chunk at a time, to a
+file or to any binary stream (the app serves them from memory as downloads).
+
+    python export.py estimates estimates.parquet
+    python export.py hierarchy hierarchy.csv
+"""
+import argparse
+import io
+import logging
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from constants import INCOME_LEVEL_TO_QTILES
+import dataset
+from estimates import FILE_FORMATS, EstimateCube, ResultWriter, household_member_count
+import shared_data
+
+log = logging.getLogger(__name__)
+
+CHUNK_ROWS = 10_000
+TABLES = ('hierarchy', 'estimates')
+FORMATS = FILE_FORMATS
+MIME_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+
+def hierarchy_frames(compiled: dataset.Dataset, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    names = compiled.category_names
+    parents = compiled.parent_idx.tolist()
+    paths = []
+    for name, parent in zip(names, parents):
+        paths.append(f'{paths[parent]} > {name}' if parent >= 0 else name)
+    subcategories = np.bincount(compiled.parent_idx[compiled.parent_idx >= 0], minlength=len(names))
+
+    for start in range(0, len(names), chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        df = pd.DataFrame({
+            'category': names[rows],
+            'path': paths[rows],
+            'level': compiled.space_counts[rows] // 2,
+            'parent': [names[i] if i >= 0 else None for i in parents[rows]],
+            'subcategories': subcategories[rows],
+        })
+        values = pd.DataFrame(compiled.expenditure[rows], columns=compiled.age_groups)
+        yield pd.concat([df, values], axis=1)
+
+
+def estimate_frames(cube: EstimateCube, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    income_levels = [i.strip() for i in INCOME_LEVEL_TO_QTILES]
+    qtiles = np.array(list(INCOME_LEVEL_TO_QTILES.values()), dtype=np.intp)
+    members = np.array([household_member_count(i) for i in cube.household_sizes], dtype=np.float64)
+    shape = (len(income_levels), len(cube.household_sizes), len(cube.dwellings))
+
+    for start in range(0, int(np.prod(shape)), chunk_rows):
+        income, household, dwelling = np.unravel_index(np.arange(start, min(start + chunk_rows, int(np.prod(shape)))), shape)
+        qtile = qtiles[income]
+        total = cube.totals[qtile, household, dwelling]
+        df = pd.DataFrame({
+            'income': np.asarray(income_levels, dtype=object)[income],
+            'household_size': np.asarray(cube.household_sizes, dtype=object)[household],
+            'dwelling': np.asarray(cube.dwellings, dtype=object)[dwelling],
+            'income_quintile': np.asarray(cube.income_quintiles, dtype=object)[qtile],
+            'estimated_total': total,
+            'estimated_household_total': total * members[household],
+        })
+        per_category = pd.DataFrame(cube.estimates[qtile, household, dwelling], columns=[f'estimate: {i}' for i in cube.categories])
+        yield pd.concat([df, per_category], axis=1)
+
+
+def write_frames(frames: Iterable[pd.DataFrame], sink: Union[Path, BinaryIO], fmt: Optional[str] = None) -> int:
+    """Writes `frames` to `sink` one at a time, returning the number of rows written"""
+    with ResultWriter(sink, fmt) as writer:
+        for df in frames: writer.write(df)
+    return writer.rows
+
+
+def _frames(table: str, compiled: dataset.Dataset, cube: Optional[EstimateCube], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    if table == 'hierarchy': return hierarchy_frames(compiled, chunk_rows)
+    if table == 'estimates': return estimate_frames(cube or EstimateCube.from_dataset(compiled), chunk_rows)
+    raise ValueError(f'Unknown table {table!r}, expected one of {TABLES}')
+
+
+def export_bytes(table: str, fmt: str, compiled: dataset.Dataset, cube: Optional[EstimateCube] = None, chunk_rows: int = CHUNK_ROWS) -> bytes:
+    """The whole export in memory, for a download"""
+    sink = io.BytesIO()
+    write_frames(_frames(table, compiled, cube, chunk_rows), sink, fmt)
+    return sink.getvalue()
+
+
+def export_file(table: str, path: Path, fmt: Optional[str] = None, source_dir: Path = dataset.cwd, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Writes an export to `path`, in the format its suffix names unless `fmt` is given; returns the number of rows"""
+    return write_frames(_frames(table, shared_data.load(source_dir), None, chunk_rows), path, fmt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the category hierarchy or the estimate grid as CSV or Parquet.')
+    parser.add_argument('table', choices=TABLES)
+    parser.add_argument('output', type=Path, help='where to write the export (.csv or .parquet)')
+    parser.add_argument('--format', choices=FORMATS, help='defaults to the format the output suffix names')
+    parser.add_argument('--source-dir', type=Path, default=dataset.cwd)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(name)s-%(levelname)s|%(lineno)d:  %(message)s', level=logging.INFO)
+    start = time.perf_counter()
+    rows = export_file(args.table, args.output, args.format, args.source_dir, args.chunk_rows)
+    log.info(f'Wrote {rows} rows to {args.output} in {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
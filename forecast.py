@@ -0,0 +1,84 @@
+"""Spending forecasts from the age-group spending multipliers.
+
+`AGE_GRP_TO_SPENDING_MUL` gives one multiplier per age group of the main income earner. The
+forecaster places each multiplier at a representative age for its group and treats the result as a
+curve over age: linearly interpolated between groups and clamped to the first/last group outside
+them. A forecast `years` ahead scales today's spending by curve(age + years) / curve(age).
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Mapping, Optional
+
+import numpy as np
+
+from constants import AGE_GROUPS, AGE_GRP_TO_SPENDING_MUL
+
+# open-ended groups are placed at the middle of the five years next to their bound
+OPEN_ENDED_GROUP_WIDTH = 5
+
+
+def representative_age(age_group: str) -> Optional[float]:
+    """Midpoint of a 'start - end' group, or of the five years below/above a 'Below N'/'N & Over' group"""
+    if match_obj := re.fullmatch(r'\s*(\d+) - (\d+)\s*', age_group):
+        start_age, end_age = (int(i) for i in match_obj.groups())
+        return (start_age + end_age) / 2
+    if match_obj := re.fullmatch(r'\s*Below (\d+)\s*', age_group):
+        return int(match_obj.group(1)) - (OPEN_ENDED_GROUP_WIDTH + 1) / 2
+    if match_obj := re.fullmatch(r'\s*(\d+) & Over\s*', age_group):
+        return int(match_obj.group(1)) + (OPEN_ENDED_GROUP_WIDTH - 1) / 2
+    return None
+
+
+class Forecaster:
+    def __init__(self, multipliers: Mapping[str, float] = AGE_GRP_TO_SPENDING_MUL):
+        ages: Dict[str, float] = {}
+        for age_group in multipliers:
+            age = representative_age(age_group)
+            if age is not None: ages[age_group] = age
+
+        order = sorted(ages, key=ages.get)
+        self.age_groups = tuple(order)
+        self.ages = np.array([ages[i] for i in order], dtype=np.float64)
+        self.multipliers = np.array([multipliers[i] for i in order], dtype=np.float64)
+        self._bounds = [self._parse_bounds(i) for i in order]
+        self.scale_factors = lru_cache(maxsize=256)(self._scale_factors)
+
+    @staticmethod
+    def _parse_bounds(age_group: str):
+        numbers = [int(i) for i in re.findall(r'\d+', age_group)]
+        if 'Below' in age_group: return (-np.inf, numbers[0])
+        if 'Over' in age_group: return (numbers[0], np.inf)
+        return (numbers[0], numbers[1] + 1)
+
+    def multiplier_at(self, ages) -> np.ndarray:
+        return np.interp(ages, self.ages, self.multipliers)
+
+    def age_group_at(self, age: float) -> str:
+        for age_group, (start, end) in zip(self.age_groups, self._bounds):
+            if start <= age < end: return age_group
+        return self.age_groups[-1]
+
+    def _scale_factors(self, age_group: str, years: int) -> Optional[np.ndarray]:
+        """Factor to scale today's spending by for each of the next 0..`years` years, None for groups with no age"""
+        age = representative_age(age_group)
+        if age is None: return None
+        curve = self.multiplier_at(age + np.arange(years + 1))
+        factors = curve / curve[0]
+        factors.flags.writeable = False
+        return factors
+
+    def trajectory(self, spending: np.ndarray, age_group: str, years: int) -> Optional[np.ndarray]:
+        """(years + 1, *spending.shape) forecast of `spending` (e.g. one amount per category), year by year"""
+        factors = self.scale_factors(age_group, years)
+        if factors is None: return None
+        spending = np.asarray(spending, dtype=np.float64)
+        return factors.reshape((-1,) + (1,) * spending.ndim) * spending
+
+    def scale_factor_table(self, horizons, age_groups=AGE_GROUPS) -> np.ndarray:
+        """(age group, horizon) scale factors, NaN for groups with no age"""
+        horizons = np.asarray(horizons, dtype=np.intp)
+        table = np.full((len(age_groups), len(horizons)), np.nan)
+        for i, age_group in enumerate(age_groups):
+            factors = self.scale_factors(age_group, int(horizons.max(initial=0)))
+            if factors is not None: table[i] = factors[horizons]
+        return table
@@ -0,0 +1,205 @@
+"""Reloads the dataset while the app is running, when its source files change.
+
+Everything derived from one load of the source files (the compiled dataset, the member tables, the
+category hierarchy (checked against the published totals), the estimate cube and profile index, the household charts) belongs to a `Generation`, built lazily and
+never modified.
+A `DataStore` holds the current generation; a watcher thread polls the source files and, once a change
+has settled, builds the next generation in full off the script threads and swaps it in with a single
+assignment. Each rerun picks up `DataStore.current` once and uses that generation throughout, so a
+rerun never mixes two datasets. Nothing else refers to a generation: it is freed with the last rerun
+(or cached grid) that used it, together with its categories and its mapping of the artifact file.
+
+    FINSIGHT_RELOAD_INTERVAL=2 streamlit run main.py      # check the source files every 2 seconds
+"""
+import functools
+import logging
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from Categories import Category, CategoryTree
+import charts
+import dataset
+from estimates import EstimateCube
+import shared_data
+from similarity import ProfileIndex
+import telemetry
+import totals
+
+log = logging.getLogger(__name__)
+
+RELOAD_INTERVAL_ENV_VAR = 'FINSIGHT_RELOAD_INTERVAL'
+
+# (file name, modification time, size) of each source file
+Fingerprint = Tuple[Tuple[str, int, int], ...]
+
+# every generation not yet garbage collected, to check that old ones are released
+_live: "weakref.WeakSet[Generation]" = weakref.WeakSet()
+
+
+def _built(method):
+    """A property computed on first access, once per generation even when several reruns ask at the same time"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def get(self: "Generation"):
+        try:
+            return self._members[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._members:
+                with telemetry.span(f'generation.{name}', generation=self.number):
+                    self._members[name] = method(self)
+            return self._members[name]
+    return property(get)
+
+
+class Generation:
+    """One load of the source files and everything derived from it"""
+
+    def __init__(self, number: int, source_dir: Path):
+        self.number = number
+        self.source_dir = source_dir
+        self._members: Dict[str, object] = {}
+        self._lock = threading.RLock()
+        _live.add(self)
+
+    def __repr__(self) -> str:
+        return f'Generation({self.number}, {str(self.source_dir)!r})'
+
+    @_built
+    def dataset(self) -> dataset.Dataset:
+        return shared_data.load(self.source_dir)
+
+    @_built
+    def member_tables(self) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        tables = self.dataset.tables
+        return tuple(tables[i].to_frame(drop_totals=True) for i in ('bynum', 'byhouse', 'byincome'))
+
+    @_built
+    def categories(self) -> List[Category]:
+        return dataset.build_categories(self.dataset)
+
+    @_built
+    def category_tree(self) -> CategoryTree:
+        tree = CategoryTree(i for i in self.categories if 'total' not in i.name.lower())
+        # the total rows are left out of the tree, but its roll-ups have to reproduce them
+        totals.report(totals.check(tree, self.dataset))
+        return tree
+
+    @_built
+    def estimate_cube(self) -> EstimateCube:
+        bynum, byhouse, byincome = self.member_tables
+        return EstimateCube(byincome, bynum, byhouse)
+
+    @_built
+    def profile_index(self) -> ProfileIndex:
+        return ProfileIndex(self.estimate_cube)
+
+    @_built
+    def household_charts(self) -> charts.HouseholdCharts:
+        return charts.HouseholdCharts(self.category_tree)
+
+    def build(self) -> "Generation":
+        """Builds every member, and every chart, now rather than on first use"""
+        self.profile_index
+        with telemetry.span('generation.warm_charts', generation=self.number):
+            self.household_charts.warm()
+        return self
+
+
+def live_generations() -> List[Generation]:
+    return sorted(_live, key=lambda i: i.number)
+
+
+def fingerprint(source_dir: Path) -> Optional[Fingerprint]:
+    """Cheap check for changed source files; None while one of them is missing"""
+    try:
+        stats = {name: path.stat() for name, path in dataset._source_paths(source_dir).items()}
+    except OSError:
+        return None
+    return tuple((name, stat.st_mtime_ns, stat.st_size) for name, stat in stats.items())
+
+
+class DataStore:
+    """The current generation of the dataset in `source_dir`, replaced when the source files change"""
+
+    def __init__(self, source_dir: Path = dataset.cwd):
+        self.source_dir = source_dir
+        self._fingerprint = fingerprint(source_dir)
+        self._current = Generation(1, source_dir)
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def current(self) -> Generation:
+        return self._current
+
+    def reload(self, force: bool = False) -> bool:
+        """Builds and swaps in a new generation if the source files changed; False when there was nothing to do.
+
+        A generation that fails to build (e.g. a file caught half-written) is logged and dropped, and the
+        current one stays in place until the files change again.
+        """
+        with self._reload_lock:
+            current_fingerprint = fingerprint(self.source_dir)
+            if current_fingerprint is None or (current_fingerprint == self._fingerprint and not force): return False
+            self._fingerprint = current_fingerprint
+
+            previous = self._current
+            if not force and previous._members.get('dataset') is not None:
+                # touched but not changed
+                if dataset.hash_sources(self.source_dir) == previous.dataset.sources: return False
+
+            try:
+                generation = Generation(previous.number + 1, self.source_dir).build()
+            except (dataset.DatasetError, OSError, ValueError) as e:
+                log.warning(f'Could not reload the dataset, keeping generation {previous.number}: {e}')
+                return False
+            self._current = generation
+            log.info(f'Reloaded the dataset as generation {generation.number}')
+            return True
+
+    def watch(self, interval: float) -> threading.Thread:
+        """Polls the source files every `interval` seconds on a daemon thread, reloading once a change has settled"""
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), name='dataset-watcher', daemon=True)
+            self._watcher.start()
+        return self._watcher
+
+    def _watch(self, interval: float):
+        seen = self._fingerprint
+        while True:
+            time.sleep(interval)
+            latest = fingerprint(self.source_dir)
+            # only reload files that did not change since the previous poll, so a file being written is not read
+            if latest != seen:
+                seen = latest
+                continue
+            if latest != self._fingerprint:
+                try:
+                    self.reload()
+                except Exception:
+                    log.exception('Reloading the dataset failed')
+
+    def watch_from_env(self) -> Optional[threading.Thread]:
+        interval = os.environ.get(RELOAD_INTERVAL_ENV_VAR)
+        if not interval: return None
+        if os.environ.get(shared_data.ENV_VAR):
+            # the published segment is fixed for the life of the loader process
+            log.warning(f'{RELOAD_INTERVAL_ENV_VAR} is ignored while {shared_data.ENV_VAR} is set')
+            return None
+        try:
+            seconds = float(interval)
+        except ValueError:
+            seconds = float('nan')
+        if not 0 < seconds < float('inf'):
+            log.warning(f'Ignoring {RELOAD_INTERVAL_ENV_VAR}={interval!r}, expected a number of seconds')
+            return None
+        return self.watch(seconds)
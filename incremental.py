@@ -0,0 +1,62 @@
+"""Per-session model of the Personal Expenditure table that is updated edit by edit.
+
+The data editor reports its edits as {"row:column": value} relative to the data it was created with.
+`SpendingModel` keeps the current amount of every category plus the running totals, and applies only
+the cells that changed since the last rerun, so the work per edit does not depend on the table size.
+"""
+from typing import Any, Hashable, List, Mapping, Optional
+
+import numpy as np
+
+
+class SpendingModel:
+    def __init__(self, profile: Hashable, baseline: np.ndarray, household_members: int, forecast_factors: Optional[np.ndarray] = None):
+        self.profile = profile
+        self.baseline = baseline
+        self.values = np.array(baseline, dtype=np.float64)
+        self.total = float(self.values.sum())
+        self.household_members = household_members
+        self.forecast_factors = forecast_factors
+
+        # what the data editor currently on screen was created with; its edits are relative to this
+        self.editor_base = self.values.copy()
+        self.editor_generation = 0
+        self._applied = {}
+
+    @property
+    def household_total(self) -> float:
+        return self.total * self.household_members
+
+    @property
+    def forecast_totals(self) -> Optional[np.ndarray]:
+        """Forecast total for each year from now, following `forecast_factors`"""
+        if self.forecast_factors is None: return None
+        return self.forecast_factors * self.total
+
+    @property
+    def edited_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.values != self.baseline)
+
+    def new_editor(self):
+        """Start a fresh data editor showing the current amounts, e.g. after the page was navigated away from"""
+        self.editor_base = self.values.copy()
+        self.editor_generation += 1
+        self._applied = {}
+
+    def set(self, row: int, value: float):
+        self.total += value - self.values[row]
+        self.values[row] = value
+
+    def apply_edits(self, edited_cells: Mapping[str, Any], column: int) -> List[int]:
+        """Applies the editor's `edited_cells` for `column` that were not applied yet; returns the rows that changed"""
+        changed = []
+        for cell, value in edited_cells.items():
+            row, col = map(int, cell.split(':'))
+            if col != column: continue
+            value = 0.0 if value is None else float(value)
+            if self._applied.get(row) == value: continue
+            self._applied[row] = value
+            if value != self.values[row]:
+                self.set(row, value)
+                changed.append(row)
+        return changed
@@ -1,18 +1,21 @@
-import base64
 import logging
 from pathlib import Path
-import pickle
-import re
-from typing import List, Union
-from attr import dataclass
+from typing import List, Tuple, Union
 
 import pandas as pd
 import streamlit as st
-import streamlit.components.v1 as components
-from st_aggrid import AgGrid, DataReturnMode, GridOptionsBuilder, GridUpdateMode
-import altair as alt
 
-from Categories import Category
+from Categories import Category, CategoryTree
+import charts
+from constants import AGE_GROUPS, INCOME_LEVEL_TO_QTILES
+import dataset
+from estimates import EstimateCube, household_member_count
+import export
+from forecast import representative_age
+import generations
+from incremental import SpendingModel
+from similarity import ProfileIndex
+import telemetry
 
 logging.basicConfig(format='%(name)s-%(levelname)s|%(lineno)d:  %(message)s', level=logging.INFO)
 log = logging.getLogger(__name__)
@@ -31,125 +34,116 @@ st.set_page_config(
     }
 )
 
-AGE_GROUPS = ('Average',
- 'Below 25',
- '25 - 29',
- '30 - 34',
- '35 - 39',
- '40 - 44',
- '45 - 49',
- '50 - 54',
- '55 - 59',
- '60 - 64',
- '65 & Over'
- )
-
-AGE_GRP_TO_SPENDING_MUL = {
-    'Average':  1.016276,
-    'Below 25': 0.846914,
-    '25 - 29':  0.924125,
-    '30 - 34': 1.043092,
-    '35 - 39': 1.121353,
-    '40 - 44': 1.22865,
-    '45 - 49': 1.16569,
-    '50 - 54': 1.17853,
-    '55 - 59': 0.996156,
-    '60 - 64': 0.832904,
-    '65 & Over': 0.646313,
-}
-
-INCOME_LEVEL_TO_QTILES = {
-  'Below 500'    :  0,
-  '500 - 999'    :  0,
-  '1,000 - 1,499':  1,
-  '1,500 - 1,999':   1,
-  '2,000 - 2,499':   2,
-  '2,500 - 2,999':   2,
-  '3,000 - 3,499':   2,
-  '3,500 - 3,999':   3,
-  '4,000 - 4,499':   3,
-  '4,500 - 4,999':   3,
-  '5,000 - 5,499':   3,
-  '5,500 - 5,999':   4,
-  '6,000 - 6,999':   4,
-  '7,000 - 7,999':   4,
-  '8,000 - 8,999':   4,
-  '9,000 & Over ':   4,
-}
-
 cwd = Path(__file__).parent
 
+# Nothing is loaded at import time: each page loads what it needs on first use (and st_aggrid is only
+# imported by the Household page), so the home page renders without touching the dataset.
 
 @st.cache_resource
+def load_store() -> generations.DataStore:
+    store = generations.DataStore(cwd)
+    store.watch_from_env()
+    return store
+
+
+# the dataset this rerun works with; a reload only takes effect from the next rerun
+generation = load_store().current
+
+
+def load_dataset() -> dataset.Dataset:
+    return generation.dataset
+
+
+def load_member_tables() -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    return generation.member_tables
+
+
 def load_data():
-    def remove_rows_that_are_totals(df): return df[df['Type of Goods and Services'].map(lambda x: 'total' not in x.lower())]
-    bynum    = remove_rows_that_are_totals(pd.read_excel('per-household-member-bynum.xlsx'))
-    byhouse  = remove_rows_that_are_totals(pd.read_excel('per-household-member-bydwelling.xlsx'))
-    byincome = remove_rows_that_are_totals(pd.read_excel('per-household-member-byincome.xlsx'))
-    
-    with open(cwd / 'singstat-avg-household-exp.pickle', 'rb') as f:
-        data = pickle.load(f)
-        
-    return bynum,byhouse,byincome,data
+    bynum,byhouse,byincome = load_member_tables()
+    return bynum,byhouse,byincome,generation.categories
 
 
+def load_category_tree() -> CategoryTree:
+    return generation.category_tree
 
-bynum,byhouse,byincome,data = load_data()
 
-data = [i for i in data if 'total' not in i.name.lower() ]
+def load_estimate_cube() -> EstimateCube:
+    return generation.estimate_cube
+
 
 def find_by_level(level:int) -> List["Category"]:
-    return [i for i in data if i.level == level]
+    return load_category_tree().find_by_level(level)
+
+def find_by_name(name:str, parent: Union[Category, None] = None) -> "Category":
+    return load_category_tree().find_by_name(name, parent=parent)
+
+
+# bounded, so the grids of replaced generations age out
+@st.cache_resource(max_entries=1024)
+def get_category_grid_data(generation_number: int, parent_idx: int, selected_age_group: str):
+    """Rows and grid options for the children of a category (or the top level when parent_idx is -1).
+
+    Built once per (generation, category, age group) and reused on every rerun, so the grid's arguments are
+    byte-identical between reruns and the browser is only sent a reference to the copy it already has.
+    """
+    from st_aggrid import GridOptionsBuilder
 
-def find_by_name(name:str) -> "Category":
-    return [i for i in data if i.name == name][0]    
+    category_tree = load_category_tree()
+    catogories = find_by_level(0) if parent_idx < 0 else category_tree.children_of(category_tree.nodes[parent_idx])
+    df = build_category_df__from_categories(catogories, selected_age_group)
+    
+    gb = GridOptionsBuilder.from_dataframe(df)
+    gb.configure_pagination(paginationAutoPageSize=True) #Add pagination
+    gb.configure_side_bar() #Add a sidebar
+    gb.configure_selection()
+    return df, gb.build()
 
 
-def create_category_grid(df: pd.DataFrame, selected_age_group: str, container_is_parent=False):
+@telemetry.timed()
+def create_category_grid(selected_age_group: str, container_is_parent=False, parent: Union[Category, None] = None):
     def get_category_selected(grid_response) -> Union[str,None]: 
         if grid_response.selected_rows: return grid_response.selected_rows[0]['Category'] 
     
-    current_category = find_by_name(df['Category'].iloc[0])
-    parent = current_category.parent_category 
+    from st_aggrid import AgGrid, DataReturnMode, GridUpdateMode
+
+    category_tree = load_category_tree()
+    parent_idx = category_tree.index_of(parent) if parent else -1
+    df, gridOptions = get_category_grid_data(generation.number, parent_idx, selected_age_group)
+    
     plot_name = f'{parent.name.title() if parent else "All"} Expenditures'
     st.header(plot_name, anchor=None, help='')
     
     if st.checkbox(f'Show Plot for {plot_name}', value=True):
-        st.bar_chart(df, x='Category',y='Amount')
-
-    gb = GridOptionsBuilder.from_dataframe(df)
-    
-    gb.configure_pagination(paginationAutoPageSize=True) #Add pagination
-    gb.configure_side_bar() #Add a sidebar
-    gb.configure_selection()
-    gridOptions = gb.build()
-    
-    grid_response = AgGrid(
-        df,
-        gridOptions=gridOptions,
-        data_return_mode=DataReturnMode.AS_INPUT, 
-        update_mode=GridUpdateMode.MODEL_CHANGED, 
-        fit_columns_on_grid_load=False,
-        enable_enterprise_modules=True,
-        height=350, 
-        width='50%',
-        reload_data=True
-    )
+        with telemetry.span('category_bar_chart', parent_idx=parent_idx):
+            charts.draw(generation.household_charts.category_chart(parent_idx, selected_age_group))
+    
+    # a stable key per (generation, age group, category) keeps each grid mounted across reruns; only grids below a changed selection get new data
+    with telemetry.span('AgGrid', parent_idx=parent_idx):
+        grid_response = AgGrid(
+            df,
+            gridOptions=gridOptions,
+            data_return_mode=DataReturnMode.AS_INPUT, 
+            update_mode=GridUpdateMode.SELECTION_CHANGED, 
+            fit_columns_on_grid_load=False,
+            enable_enterprise_modules=True,
+            height=350, 
+            width='50%',
+            reload_data=False,
+            key=f'category_grid|{generation.number}|{selected_age_group}|{parent_idx}',
+        )
     if df['More details'].map(lambda i: i=='Yes').any():
         st.caption('Some categories in the table may contain subcategories. You may further expand these categories by clicking on them.')
     
-    st.metric(label="Total", value=f"${df['Amount'].sum():.2f}") # show sum of above table
+    st.metric(label="Total", value=f"${category_tree.total(parent, selected_age_group):.2f}") # show sum of above table
 
         
     category_name = get_category_selected(grid_response)
     
     def show_subgrid():
         if category_name:
-            category = find_by_name(category_name)
-            children = category.subcategories
-            if children:
-                children_df = build_category_df__from_categories(children,selected_age_group)
-                create_category_grid(children_df, selected_age_group)
+            category = find_by_name(category_name, parent=parent)
+            if category_tree.children_of(category):
+                create_category_grid(selected_age_group, parent=category)
     
     if container_is_parent:
         with st.expander("More details"): 
@@ -157,10 +151,14 @@ def create_category_grid(df: pd.DataFrame, selected_age_group: str, container_is
     else: show_subgrid()
 
 
+@telemetry.timed()
 def build_category_df__from_categories(catogories: List[Category], age):
-    d = [{'Category':i.name, 'Amount': i.get_age_group(age), 'More details': 'Yes' if bool(i.subcategories) else 'No'} for i in catogories]
-    d = sorted(d, key=lambda x:x['Amount'], reverse=True)
-    return pd.DataFrame(d)
+    df = pd.DataFrame({
+        'Category': [i.name for i in catogories],
+        'Amount': load_category_tree().values_of(catogories, age),
+        'More details': ['Yes' if bool(i.subcategories) else 'No' for i in catogories],
+    })
+    return df.sort_values('Amount', ascending=False, kind='stable', ignore_index=True)
 
 def move_column_to_front(df, col_name, index:int):
     col = df.pop(col_name)
@@ -168,31 +166,56 @@ def move_column_to_front(df, col_name, index:int):
     return df
 
 
+# bounded, so the exports of replaced generations age out
+@st.cache_resource(max_entries=16)
+@telemetry.timed()
+def get_export(generation_number: int, table: str, fmt: str) -> bytes:
+    """An export of this rerun's generation, built once per generation"""
+    return export.export_bytes(table, fmt, generation.dataset, generation.estimate_cube)
+
+
+def show_download_buttons(table: str, caption: str):
+    st.caption(caption)
+    for column, fmt in zip(st.columns(len(export.FORMATS)), export.FORMATS):
+        with column:
+            file_name = f'{APP_NAME.lower()}-{table}.{fmt}'
+            st.download_button(file_name, get_export(generation.number, table, fmt), file_name=file_name,
+                               mime=export.MIME_TYPES[fmt], key=f'download|{table}|{fmt}')
+
+
+def show_similar_profiles(container, index: ProfileIndex, spending, age_group: str):
+    # the profiles' spending includes their age group's multiplier, the amounts in the table do not
+    nearest = index.nearest(spending, k=3, age_group=age_group)
+    container.subheader('Households Most Like Yours')
+    container.caption('The profiles whose estimated spending is closest to the amounts in your table.')
+    container.dataframe(
+        nearest.drop(columns='distance').rename(columns=str.title).rename(columns={'Total': 'Estimated Total'}).reset_index(drop=True).round(2),
+        use_container_width=True,
+    )
+    deviations = index.deviations(spending, nearest.index[0], top=5, age_group=age_group)
+    container.caption('Where your spending differs most from the closest of them:')
+    container.dataframe(deviations.rename(columns=str.capitalize).round(2), use_container_width=True)
+
+
+@telemetry.timed()
 def IndividualExpenditurePage():
     container = st.container()
     
+    cube = load_estimate_cube()
+    
     def select_num_household():
-        selected_household_size = container.select_slider('Number of people in your household', options=bynum.columns[1:], value=None)
-        df = pd.concat([byincome['Type of Goods and Services'], bynum[selected_household_size]], axis=1)
-        df = df.rename({df.columns[1]: 'Amount'},axis=1 )
-        return df,selected_household_size
+        selected_household_size = container.select_slider('Number of people in your household', options=cube.household_sizes, value=None)
+        return cube.household_size_index(selected_household_size), selected_household_size
     
 
     def select_income():
-        def get_data_by_income(qtile:int):
-            df = pd.concat([byincome['Type of Goods and Services'], byincome.iloc[:, 2:].iloc[:, qtile]], axis=1)
-            return df.rename({df.columns[1]: 'Amount'},axis=1 )
-        
         selected_income = container.selectbox('Your Individual Income Level (after CPF)', options=INCOME_LEVEL_TO_QTILES.keys(), index=4)
         qtile = INCOME_LEVEL_TO_QTILES[selected_income]
-        df = get_data_by_income(qtile)
-        return df, selected_income
+        return qtile, selected_income
     
     def select_house_type():
-        selected_house_type = container.selectbox('Your House', options=byhouse.columns[1:], index=4)
-        df = pd.concat([byhouse['Type of Goods and Services'], byhouse[selected_house_type]], axis=1)
-        df = df.rename({df.columns[1]: 'Amount'},axis=1 )
-        return df,selected_house_type
+        selected_house_type = container.selectbox('Your House', options=cube.dwellings, index=4)
+        return cube.dwelling_index(selected_house_type), selected_house_type
     
     def select_age_grp():
         selected_age_grp = container.selectbox('Your Age Group', options=AGE_GROUPS, index=2)
@@ -216,49 +239,56 @@ This information empowers you to make informed financial decisions and plan for
 
     selected_age_grp                                   = select_age_grp()
     container.markdown('<br>', unsafe_allow_html=True)
-    expenditure_by_income,     selected_income         = select_income()
+    qtile,                     selected_income         = select_income()
     container.markdown('<br>', unsafe_allow_html=True)
-    expenditure_by_num_family, selected_household_size = select_num_household()
+    household_size_idx,        selected_household_size = select_num_household()
     container.markdown('<br>', unsafe_allow_html=True)
-    expenditure_by_dwelling,   selected_house_type     = select_house_type()
+    dwelling_idx,              selected_house_type     = select_house_type()
     container.markdown('<br/>', unsafe_allow_html=True)
     container.markdown('<br/>', unsafe_allow_html=True)
     container.markdown('<br/>', unsafe_allow_html=True)
     
     
-    expenditure_by_income['Amount based on Income Quartile']     = expenditure_by_income['Amount']
-    expenditure_by_income = expenditure_by_income.drop('Amount', axis=1)
-    
-    expenditure_by_num_family['Amount based on Household Size']     = expenditure_by_num_family['Amount']
-    expenditure_by_num_family = expenditure_by_num_family.drop('Amount', axis=1)
-    expenditure_by_num_family = expenditure_by_num_family.drop('Type of Goods and Services', axis=1)
-    
-    expenditure_by_dwelling['Amount based on Dwelling Type']     = expenditure_by_dwelling['Amount']
-    expenditure_by_dwelling = expenditure_by_dwelling.drop('Amount', axis=1)
-    expenditure_by_dwelling = expenditure_by_dwelling.drop('Type of Goods and Services', axis=1)
-    
-    try:
-        selected_household_size = int(selected_household_size)
-    except ValueError:
-        selected_household_size = 3
+    selected_household_size = household_member_count(selected_household_size)
     
-    t_df = pd.concat([expenditure_by_income, expenditure_by_num_family, expenditure_by_dwelling],axis=1)
-    t_df['Estimated Amount'] = t_df.iloc[:, 1:].mean(axis=1)
-    t_df['Estimated Amount'] = t_df['Estimated Amount'].round(2)
-    t_df = move_column_to_front(t_df, 'Estimated Amount', 1)
+    # the estimate and any edits made to it live in the session, so reruns and page switches only apply new edits;
+    # another profile or a reloaded dataset starts a new one
+    profile = (qtile, household_size_idx, dwelling_idx)
+    model: SpendingModel = st.session_state.get('spending_model')
+    if model is None or model.profile != (generation.number, *profile):
+        model = SpendingModel((generation.number, *profile), cube.estimate(*profile), selected_household_size)
+        st.session_state['spending_model'] = model
     
     show_underlying_data = container.checkbox('Show Underlying Data', value=False)
-    displayed_df = t_df
-    if not show_underlying_data:
-        displayed_df = displayed_df.iloc[:,:2]
-    displayed_df = container.experimental_data_editor(data=displayed_df, use_container_width=True)
+    editor_key = f'spending_editor|{model.editor_generation}|{show_underlying_data}'
+    if editor_key not in st.session_state:
+        model.new_editor()
+        editor_key = f'spending_editor|{model.editor_generation}|{show_underlying_data}'
+    
+    displayed_df = pd.DataFrame({
+        'Type of Goods and Services':      cube.categories,
+        'Estimated Amount':                model.editor_base,
+    })
+    if show_underlying_data:
+        components = cube.components(*profile)
+        displayed_df['Amount based on Income Quartile'] = components[:, 0]
+        displayed_df['Amount based on Household Size']  = components[:, 1]
+        displayed_df['Amount based on Dwelling Type']   = components[:, 2]
+    with telemetry.span('data_editor'):
+        container.experimental_data_editor(data=displayed_df, use_container_width=True, key=editor_key)
+    # edited_cells are keyed by "row:column" position, where column 0 is the index
+    model.apply_edits(st.session_state.get(editor_key, {}).get('edited_cells', {}), column=2)
     
     container.caption('You can change any of the amounts in the table to reflect your actual spending, and the totals will be updated.')
     container.caption('For example, if you spent 300 on food last month, double click on the value in *Estimated Amount* and update the value to 300.')
     container.caption('You can dive into what goes into each category of expenditure in the *Household Expenditure* page')
     
+    if model.edited_rows.size:
+        with telemetry.span('similar_profiles'):
+            show_similar_profiles(container, generation.profile_index, model.values, selected_age_grp)
     
-    estimated_individual_spend = displayed_df['Estimated Amount'].sum()
+    
+    estimated_individual_spend = model.total
     # existing_age_scale_factor = AGE_GRP_TO_SPENDING_MUL.get(selected_age_grp, 1)
     # estimated_individual_spend = estimated_individual_spend * existing_age_scale_factor
     
@@ -285,48 +315,58 @@ This information empowers you to make informed financial decisions and plan for
             
     with col2:
         delta = get_delta_from_prev_spend(1)
-        st.metric(label="Estimated Household Total", value=f"${estimated_individual_spend * selected_household_size:.2f}", delta=f'{delta:.2f}') # show sum of above table
+        st.metric(label="Estimated Household Total", value=f"${model.household_total:.2f}", delta=f'{delta:.2f}') # show sum of above table
     st.divider()
 
     
-    start_age, end_age, existing_age_scale_factor = None, None, None
-    if selected_age_grp:
-        match_obj = re.search(r'(\d+) - (\d+)', selected_age_grp)
-        if match_obj:
-            groups = match_obj.groups()
-            if len(groups) == 2:
-                start_age, end_age = groups
-                start_age, end_age = int(start_age), int(end_age)
-                existing_age_scale_factor = AGE_GRP_TO_SPENDING_MUL.get(selected_age_grp, None)
-    
-    if start_age and end_age and existing_age_scale_factor:
-        idx = 2
-        for header, age_delta in (
+    forecast_years = container.slider('Forecast how many years ahead', min_value=5, max_value=40, value=20, step=1)
+    model.forecast_factors = cube.forecaster.scale_factors(selected_age_grp, forecast_years)
+    forecast_totals = model.forecast_totals
+    if forecast_totals is not None:
+        current_age = representative_age(selected_age_grp)
+        horizons = [(header, age_delta) for header, age_delta in (
             ('Five Years Time', 5),
             ('Ten Years Time', 10),
             ('Twenty Years Time', 20),
-        ):
-            new_age_grp = f'{start_age + age_delta} - {end_age + age_delta}'
-            new_grp_scale_factor = AGE_GRP_TO_SPENDING_MUL.get(new_age_grp, None)
-            if new_grp_scale_factor:
-                scale_factor = new_grp_scale_factor/existing_age_scale_factor
-                estimated_spend = estimated_individual_spend * scale_factor
+        ) if age_delta <= forecast_years]
+        if forecast_years not in (5, 10, 20):
+            horizons.append((f'{forecast_years} Years Time', forecast_years))
+        
+        for header, age_delta in horizons:
+            estimated_spend = forecast_totals[age_delta]
+            
+            col0, col1, col2 = st.columns(3)
+            with col0:
+                st.subheader(header)
+                st.caption(f'Age group: {cube.forecaster.age_group_at(current_age + age_delta)}')
+            with col1:
+                st.metric(label="Estimated Total", value=f"${estimated_spend:.2f}") # show sum of above table
+            with col2:
+                st.metric(label="Estimated Household Total", value=f"${estimated_spend * model.household_members:.2f}") # show sum of above table
                 
-                col0, col1, col2 = st.columns(3)
-                with col0:
-                    st.subheader(header)
-                    st.caption(f'Age group: {new_age_grp}')
-                with col1:
-                    st.metric(label="Estimated Total", value=f"${estimated_spend:.2f}") # show sum of above table
-                with col2:
-                    st.metric(label="Estimated Household Total", value=f"${estimated_spend * selected_household_size:.2f}") # show sum of above table
-                    
-                st.divider()
+            st.divider()
+        
+        st.subheader('Forecast by Year')
+        with telemetry.span('forecast_line_chart'):
+            st.vega_lite_chart(pd.DataFrame({'Years from now': range(forecast_years + 1), 'Estimated Total': forecast_totals}),
+                               charts.FORECAST_LINE_CHART_SPEC, use_container_width=True)
+        
+        if st.checkbox('Show Forecast by Category', value=False):
+            with telemetry.span('category_forecast'):
+                # (years + 1, category) amounts, year by year, of the spending in the table above
+                trajectory = cube.forecaster.trajectory(model.values, selected_age_grp, forecast_years)
+                st.dataframe(pd.DataFrame(
+                    {header: trajectory[years] for header, years in [('Now', 0), *horizons]},
+                    index=pd.Index(cube.categories, name='Type of Goods and Services'),
+                ).round(2), use_container_width=True)
             
+    st.divider()
+    show_download_buttons('estimates', 'Download the estimates for every income level, household size and house type')
 
     return container
 
 
+@telemetry.timed()
 def IntroPage():
     container = st.container()
     md_text = f"""
@@ -361,6 +401,31 @@ Start your financial planning journey today with {APP_NAME} and gain valuable in
 
 
 
+@telemetry.timed()
+def HouseholdExpenditurePage():
+    st.header('Explore Household Expenditure by Category')
+    st.write("Delve into what goes into the typical Singaporean household's expenditure.")
+    # st.write("Delve into the average monthly spending habits of Singaporean households using our informative graph, which showcases the connection between the age group of the primary income earner and the overall household expenses.")
+    st.write("Our detailed breakdown of expenditure categories dives into three levels of depth (e.g., Misc -> Insurance -> Health insurance) to give you a better understanding of the intricacies of household spending patterns in Singapore.")
+    st.markdown('<br/>', unsafe_allow_html=True)
+    st.markdown('<br/>', unsafe_allow_html=True)
+
+    st.subheader('Average Monthly Household Expenditure Among Resident Households', anchor=None, help='')
+    st.caption('This chart shows the average monthly expenditure by households for different ages of the main breadwinner.')
+    with telemetry.span('age_line_chart'):
+        charts.draw(generation.household_charts.age_chart)
+    
+    if st.checkbox('View Expenditure by Category'):
+        st.caption('Delve into the different categories that make up the total household expenditure')
+        
+        selected_age_group: str = charts.AGE_GROUP_COLUMNS[st.selectbox('Age Group of Main Income Earner', AGE_GROUPS)]  # type: ignore
+        
+        create_category_grid(selected_age_group, container_is_parent=True)
+
+    st.divider()
+    show_download_buttons('hierarchy', 'Download every category and subcategory for every age group')
+
+
 def main():
     
     with st.sidebar:
@@ -412,39 +477,9 @@ def main():
         IndividualExpenditurePage()
     
     elif HOUSEHOLD_PAGE_Selected:
-        st.header('Explore Household Expenditure by Category')
-        st.write("Delve into what goes into the typical Singaporean household's expenditure.")
-        # st.write("Delve into the average monthly spending habits of Singaporean households using our informative graph, which showcases the connection between the age group of the primary income earner and the overall household expenses.")
-        st.write("Our detailed breakdown of expenditure categories dives into three levels of depth (e.g., Misc -> Insurance -> Health insurance) to give you a better understanding of the intricacies of household spending patterns in Singapore.")
-        st.markdown('<br/>', unsafe_allow_html=True)
-        st.markdown('<br/>', unsafe_allow_html=True)
-
-        # the lines for if age_grp == 'Average': age_grp = 'Total' is because the data is stored in a pickle file and we want to rename the Total Column to Average but did not recreate the pickle file
-        
-        spending_by_age_df = {'Age Group':[],'Total Amount':[]}
-        for age_grp in AGE_GROUPS:
-            if age_grp == 'Average': age_grp = 'Total'
-            total_spending = build_category_df__from_categories(find_by_level(0), age_grp)['Amount'].sum()
-            if age_grp == 'Total': age_grp = 'Average'
-            spending_by_age_df['Age Group'].append(age_grp)
-            spending_by_age_df['Total Amount'].append(total_spending)
-            
-            
-        spending_by_age_df = pd.DataFrame(spending_by_age_df)
-        
-        st.subheader('Average Monthly Household Expenditure Among Resident Households', anchor=None, help='')
-        st.caption('This chart shows the average monthly expenditure by households for different ages of the main breadwinner.')
-        st.line_chart(spending_by_age_df, x='Age Group', y='Total Amount')
-        
-        if st.checkbox('View Expenditure by Category'):
-            st.caption('Delve into the different categories that make up the total household expenditure')
-            
-            selected_age_group: str = st.selectbox('Age Group of Main Income Earner', AGE_GROUPS)  # type: ignore
-            catogories = find_by_level(0)
-            if selected_age_group == 'Average': selected_age_group = 'Total'
-            
-            df = build_category_df__from_categories(catogories,selected_age_group)
-            create_category_grid(df,selected_age_group, container_is_parent=True)
-        
+        HouseholdExpenditurePage()
+
 
-main()
\ No newline at end of file
+telemetry.serve_from_env()
+with telemetry.rerun():
+    main()
@@ -0,0 +1,195 @@
+"""Several survey years of the expenditure table side by side.
+
+Each year is a directory holding the usual SingStat files (see `dataset.MEMBER_TABLES`), compiled and
+cached by `dataset.load` as for the single-year app. `YearStore` lines the years up in one
+(year, category, age group) array. The hierarchy is interned across years: a category is identified by
+its path of labels from the top level, and one row (and one copy of its label) stands for it in every
+year, so each added year only adds its numbers. Categories or age groups a year does not have are NaN
+for that year.
+
+    python multiyear.py 2017/18=. 2022/23=data/2022-23     # year-over-year changes between two years
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from Categories import AgeGroupValues, Category, build_hierarchy
+import dataset
+
+# the survey the files in the repository root come from
+DEFAULT_YEAR = '2017/18'
+
+LabelPath = Tuple[str, ...]
+
+
+def _row_paths(compiled: dataset.Dataset) -> List[LabelPath]:
+    paths: List[LabelPath] = []
+    for name, parent in zip(compiled.category_names, compiled.parent_idx.tolist()):
+        paths.append((paths[parent] if parent >= 0 else ()) + (sys.intern(name),))
+    return paths
+
+
+class YearStore:
+    """(year, category, age group) amounts over the union of every year's categories, rows numbered depth-first"""
+
+    def __init__(self):
+        self.years: List[str] = []
+        self.age_groups: List[str] = []
+        self.paths: List[LabelPath] = []
+        self.space_counts: Dict[LabelPath, int] = {}
+        self.categories: List[Category] = []
+        self.parent_idx = np.empty(0, dtype=np.intp)
+        self.values = np.empty((0, 0, 0))
+        self.member_tables: Dict[str, Dict[str, dataset.MemberTable]] = {}
+        self._index_of: Dict[LabelPath, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.years)
+
+    @classmethod
+    def from_datasets(cls, datasets: Mapping[str, dataset.Dataset]) -> "YearStore":
+        store = cls()
+        for year, compiled in datasets.items(): store.add_year(year, compiled)
+        return store
+
+    def add_year(self, year: str, compiled: dataset.Dataset):
+        """Adds (or replaces) one year; categories are rebuilt with their values viewing the latest year"""
+        row_paths = _row_paths(compiled)
+        space_counts = dict(zip(row_paths, compiled.space_counts.tolist()))
+        new_paths = [i for i in dict.fromkeys(row_paths) if i not in self._index_of]
+        new_age_groups = [i for i in compiled.age_groups if i not in self.age_groups]
+
+        if new_paths: self._add_categories(new_paths, space_counts)
+        if new_age_groups:
+            self.age_groups = self.age_groups + new_age_groups
+            self.values = np.concatenate([self.values, np.full(self.values.shape[:2] + (len(new_age_groups),), np.nan)], axis=2)
+
+        year_values = np.full((len(self.paths), len(self.age_groups)), np.nan)
+        rows = np.fromiter((self._index_of[i] for i in row_paths), dtype=np.intp, count=len(row_paths))
+        columns = np.array([self.age_groups.index(i) for i in compiled.age_groups], dtype=np.intp)
+        year_values[np.ix_(rows, columns)] = compiled.expenditure
+
+        if year in self.years:
+            self.values = self.values.copy()
+            self.values[self.years.index(year)] = year_values
+        else:
+            self.years.append(year)
+            self.values = np.concatenate([self.values, year_values[None]], axis=0)
+        self.values.flags.writeable = False
+        self.member_tables[year] = compiled.tables
+        self._build_categories()
+
+    def _add_categories(self, new_paths: Sequence[LabelPath], space_counts: Mapping[LabelPath, int]):
+        """Adds categories and renumbers all of them depth-first, so every subtree stays a contiguous block"""
+        children: Dict[Optional[LabelPath], List[LabelPath]] = {}
+        for path in self.paths + list(new_paths):
+            children.setdefault(path[:-1] or None, []).append(path)
+
+        order: List[LabelPath] = []
+        stack = list(reversed(children.get(None, [])))
+        while stack:
+            path = stack.pop()
+            order.append(path)
+            stack.extend(reversed(children.get(path, [])))
+
+        if self.paths:
+            old_rows = np.array([self._index_of.get(i, -1) for i in order], dtype=np.intp)
+            values = np.full((len(self.years), len(order), len(self.age_groups)), np.nan)
+            values[:, old_rows >= 0] = self.values[:, old_rows[old_rows >= 0]]
+            self.values = values
+        else:
+            self.values = np.full((len(self.years), len(order), len(self.age_groups)), np.nan)
+
+        self.space_counts.update((i, space_counts[i]) for i in new_paths)
+        self.paths = order
+        self._index_of = {path: i for i, path in enumerate(order)}
+        self.parent_idx = np.array([self._index_of[i[:-1]] if len(i) > 1 else -1 for i in order], dtype=np.intp)
+
+    def _build_categories(self):
+        """Category objects in row order, each `values` viewing its row for the latest year as the single-year app expects"""
+        columns = {age_grp: i for i, age_grp in enumerate(self.age_groups)}
+        self.categories = build_hierarchy(
+            (path[-1], self.space_counts[path], parent, AgeGroupValues(row, columns))
+            for path, parent, row in zip(self.paths, self.parent_idx.tolist(), self.values[-1])
+        )
+
+    def year_index(self, year: str) -> int:
+        try:
+            return self.years.index(year)
+        except ValueError:
+            raise KeyError(f'No data for {year!r}') from None
+
+    def index_of(self, category: Category) -> int:
+        path = tuple(i.name for i in self._ancestry(category))
+        try:
+            return self._index_of[path]
+        except KeyError:
+            raise KeyError(f'{category.name} is not part of this store') from None
+
+    @staticmethod
+    def _ancestry(category: Category) -> List[Category]:
+        chain = []
+        while category is not None:
+            chain.append(category)
+            category = category.parent_category
+        return chain[::-1]
+
+    def find(self, *path: str) -> Category:
+        """The category at `path`, e.g. find('FOOD AND NON-ALCOHOLIC BEVERAGES', 'FOOD')"""
+        try:
+            return self.categories[self._index_of[path]]
+        except KeyError:
+            raise KeyError(f'No category {" > ".join(path)!r}') from None
+
+    def for_year(self, year: str) -> np.ndarray:
+        """(category, age group) amounts for one year"""
+        return self.values[self.year_index(year)]
+
+    def series(self, category: Category, age_group: str = 'Total') -> np.ndarray:
+        """Amount of `category` in each year"""
+        return self.values[:, self.index_of(category), self.age_groups.index(age_group)]
+
+    def deltas(self) -> np.ndarray:
+        """(year - 1, category, age group) change from each year to the next"""
+        return np.diff(self.values, axis=0)
+
+    def growth(self) -> np.ndarray:
+        """(year - 1, category, age group) relative change from each year to the next, NaN where the earlier year is 0 or missing"""
+        before, after = self.values[:-1], self.values[1:]
+        return np.divide(after - before, before, out=np.full(after.shape, np.nan), where=(before != 0) & ~np.isnan(before))
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+
+def load_years(sources: Mapping[str, Path]) -> YearStore:
+    """One store from a {year: source directory} mapping, in the given year order"""
+    return YearStore.from_datasets({year: dataset.load(Path(source_dir)) for year, source_dir in sources.items()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Year-over-year changes in average household expenditure.')
+    parser.add_argument('years', nargs='+', metavar='YEAR=DIR', help=f'survey year and its source directory, e.g. {DEFAULT_YEAR}=.')
+    parser.add_argument('--age-group', default='Total')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    store = load_years(dict(i.split('=', 1) for i in args.years))
+    print(f'{len(store)} years, {len(store.categories)} categories, {len(store.age_groups)} age groups, {store.nbytes} bytes of amounts')
+    if len(store) < 2: return
+
+    column = store.age_groups.index(args.age_group)
+    growth, deltas = store.growth()[..., column], store.deltas()[..., column]
+    for i in range(len(store) - 1):
+        print(f'\n{store.years[i]} -> {store.years[i + 1]}, largest changes ({args.age_group}):')
+        order = np.argsort(-np.nan_to_num(np.abs(deltas[i])))[:args.top]
+        for row in order:
+            print(f'  {" > ".join(store.paths[row]):<70} {deltas[i, row]:+10.1f} {growth[i, row]:+8.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Serves one copy of the compiled dataset to every Streamlit worker process on a host.
+
+A loader process publishes the dataset into a `multiprocessing.shared_memory` segment, in the same
+layout as the artifact file, and keeps it alive until it is stopped. Workers started with
+`FINSIGHT_SHARED_DATASET` set to the segment name attach to it instead of reading the source files:
+every array `load_data` hands out (the member tables, the expenditure matrix behind each category's
+values) is then a read-only view onto the segment, so the numbers exist once however many workers run.
+
+    python shared_data.py publish                       # in the loader process, before the workers
+    FINSIGHT_SHARED_DATASET=finsight-dataset streamlit run main.py
+
+Without the variable each worker memory-maps the artifact file itself (see `dataset.load`). On Windows
+a segment is removed once no process has it open, so the loader has to keep running while workers
+attach.
+"""
+import argparse
+import atexit
+import logging
+import os
+import signal
+import threading
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+import dataset
+
+log = logging.getLogger(__name__)
+
+ENV_VAR = 'FINSIGHT_SHARED_DATASET'
+DEFAULT_NAME = 'finsight-dataset'
+
+# attached segments are kept referenced for the life of the process, the views handed out point into them
+_attached: Dict[str, SharedMemory] = {}
+
+
+def publish(name: str = DEFAULT_NAME, source_dir: Path = dataset.cwd) -> SharedMemory:
+    """Copies the dataset into a new shared memory segment; the caller owns it and must `unlink` it when done"""
+    data = dataset.artifact_bytes(dataset.load(source_dir))
+    segment = SharedMemory(name=name, create=True, size=len(data))
+    segment.buf[:len(data)] = data
+    log.info(f'Published the dataset as {name!r} ({len(data)} bytes)')
+    return segment
+
+
+def attach(name: str = DEFAULT_NAME) -> dataset.Dataset:
+    """Dataset whose arrays are read-only views onto the published segment `name`"""
+    if name not in _attached:
+        try:
+            segment = SharedMemory(name=name)
+        except FileNotFoundError:
+            raise dataset.DatasetError(f'No dataset has been published as {name!r}') from None
+        # the resource tracker would unlink the segment when this worker exits, taking it away from the others
+        # (POSIX only: on Windows there is no tracker, a segment lives as long as some process has it open)
+        if os.name == 'posix': resource_tracker.unregister(segment._name, 'shared_memory')
+        _attached[name] = segment
+        if len(_attached) == 1: atexit.register(_detach_all)
+    return dataset.read_buffer(np.frombuffer(_attached[name].buf, dtype=np.uint8), name)
+
+
+def _detach_all():
+    # views handed out may outlive the segments at interpreter exit, where closing them would raise BufferError;
+    # the mappings go away with the process anyway
+    for segment in _attached.values():
+        segment._buf = segment._mmap = None
+    _attached.clear()
+
+
+def load(source_dir: Path = dataset.cwd) -> dataset.Dataset:
+    """The published dataset when `FINSIGHT_SHARED_DATASET` names one, else the artifact in `source_dir`"""
+    name: Optional[str] = os.environ.get(ENV_VAR)
+    if name: return attach(name)
+    return dataset.load(source_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('publish',))
+    parser.add_argument('--name', default=DEFAULT_NAME)
+    parser.add_argument('--source-dir', type=Path, default=dataset.cwd)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(name)s-%(levelname)s|%(lineno)d:  %(message)s', level=logging.INFO)
+    segment = publish(args.name, args.source_dir)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    try:
+        # waits in steps, so that Ctrl+C is noticed on Windows too
+        while not stopped.wait(1): pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        segment.close()
+        segment.unlink()
+        log.info(f'Removed {args.name!r}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Which household profiles a spending vector looks most like.
+
+A profile is one (income quintile, household size, dwelling type, age group) combination. Its spending
+vector is the cube's per-category estimate for the quintile, size and dwelling, scaled by the age
+group's spending multiplier (the same multipliers the forecasts follow). The 'Average' columns of the
+source tables are summaries rather than profiles and are left out. Amounts that are before the age
+multiplier, like the Personal Expenditure page's, are matched with their `age_group`: they are ranked
+scaled by its multiplier, and the results are reported back in their own units.
+`ProfileIndex` keeps every profile's
+vector in one (profile, category) array, so matching a vector, or a whole table of them, is a few
+matrix operations.
+
+    python similarity.py spending.csv matches.csv --k 3      # one column per category, one row per household
+"""
+import argparse
+import logging
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from constants import AGE_GRP_TO_SPENDING_MUL
+from estimates import EstimateCube, ResultWriter, load_cube, read_profiles
+
+log = logging.getLogger(__name__)
+
+METRICS = ('euclidean', 'cosine')
+PROFILE_LABELS = ('income quintile', 'household size', 'dwelling', 'age group')
+
+# vectors are ranked against the profiles this many at a time, bounding the (vectors, profiles) intermediate
+BATCH_SIZE = 4096
+# up to this many matches per vector are picked by repeated argmin, which beats a partial sort for small k
+ARGMIN_K = 16
+
+
+def _is_profile(label: str) -> bool:
+    return 'average' not in label.lower()
+
+
+class ProfileIndex:
+    """Spending vectors of every profile, for nearest-profile queries"""
+
+    def __init__(self, cube: EstimateCube):
+        self.categories: List[str] = cube.categories
+        forecaster = cube.forecaster
+        axes = (
+            [i for i, label in enumerate(cube.income_quintiles) if _is_profile(label)],
+            [i for i, label in enumerate(cube.household_sizes) if _is_profile(label)],
+            [i for i, label in enumerate(cube.dwellings) if _is_profile(label)],
+            list(range(len(forecaster.age_groups))),
+        )
+        self._labels = (cube.income_quintiles, cube.household_sizes, cube.dwellings, forecaster.age_groups)
+
+        # (profile, 4) indices along the axes of `_labels`, profiles in cube order with the age group last
+        grids = np.meshgrid(*(np.array(i, dtype=np.intp) for i in axes), indexing='ij')
+        self.codes = np.stack([i.ravel() for i in grids], axis=1)
+        q, s, d, a = self.codes.T
+        self.vectors = cube.estimates[q, s, d] * forecaster.multipliers[a, None]
+        self._norms = np.linalg.norm(self.vectors, axis=1)
+        # ranking many vectors is dominated by the matrix product, which float32 halves; distances are float64
+        self._vectors32 = self.vectors.astype(np.float32)
+        self._units32 = (self.vectors / self._norms[:, None]).astype(np.float32)
+        self._sq_norms32 = (self._norms ** 2).astype(np.float32)
+        for array in (self.codes, self.vectors, self._norms, self._vectors32, self._units32, self._sq_norms32):
+            array.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def labels(self, profile: int) -> Tuple[str, str, str, str]:
+        return tuple(labels[code] for labels, code in zip(self._labels, self.codes[profile]))
+
+    @staticmethod
+    def multiplier(age_group: Optional[str]) -> float:
+        """Spending multiplier of `age_group` (including 'Average'), 1 for None"""
+        if age_group is None: return 1.0
+        try:
+            return AGE_GRP_TO_SPENDING_MUL[age_group]
+        except KeyError:
+            raise KeyError(f'Unknown age group {age_group!r}') from None
+
+    def distances(self, vectors: np.ndarray, metric: str = 'euclidean') -> np.ndarray:
+        """(vector, profile) distances of a (vector, category) array, or (profile,) for a single vector.
+
+        'euclidean' compares amounts, 'cosine' only how spending is split between categories.
+        """
+        vectors = np.asarray(vectors, dtype=np.float64)
+        single = vectors.ndim == 1
+        vectors = np.atleast_2d(vectors)
+        if vectors.shape[1] != len(self.categories):
+            raise ValueError(f'Expected {len(self.categories)} amounts per vector, got {vectors.shape[1]}')
+
+        products = vectors @ self.vectors.T
+        norms = np.linalg.norm(vectors, axis=1)[:, None]
+        if metric == 'euclidean':
+            # |x - p|^2 = |x|^2 - 2 x.p + |p|^2, clipped where rounding takes it below 0
+            result = np.sqrt(np.maximum(norms ** 2 - 2 * products + self._norms ** 2, 0))
+        elif metric == 'cosine':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result = 1 - products / (norms * self._norms)
+        else:
+            raise ValueError(f'Unknown metric {metric!r}, expected one of {METRICS}')
+        return result[0] if single else result
+
+    def _ranking(self, vectors: np.ndarray, metric: str) -> np.ndarray:
+        """(vector, profile) scores ordering the profiles roughly like `distances`, in one or two passes"""
+        if metric == 'euclidean':
+            # |x - p|^2 less |x|^2, which is the same for every profile of a row
+            scores = (vectors * -2).astype(np.float32) @ self._vectors32.T
+            scores += self._sq_norms32
+        elif metric == 'cosine':
+            # -cos(x, p) times |x|, which is the same for every profile of a row
+            scores = (-vectors).astype(np.float32) @ self._units32.T
+        else:
+            raise ValueError(f'Unknown metric {metric!r}, expected one of {METRICS}')
+        return scores
+
+    def nearest_batch(self, vectors: np.ndarray, k: int = 1, metric: str = 'euclidean') -> Tuple[np.ndarray, np.ndarray]:
+        """(vector, k) indices and distances of the `k` closest profiles to each row of `vectors`, closest first"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float64))
+        if vectors.shape[1] != len(self.categories):
+            raise ValueError(f'Expected {len(self.categories)} amounts per vector, got {vectors.shape[1]}')
+        k = min(k, len(self))
+        indices = np.empty((len(vectors), k), dtype=np.intp)
+        for start in range(0, len(vectors), BATCH_SIZE):
+            scores = self._ranking(vectors[start:start + BATCH_SIZE], metric)
+            chunk = indices[start:start + len(scores)]
+            if k <= ARGMIN_K:
+                rows = np.arange(len(scores))
+                for rank in range(k):
+                    chunk[:, rank] = scores.argmin(axis=1)
+                    scores[rows, chunk[:, rank]] = np.inf
+            else:
+                top = np.argpartition(scores, k - 1, axis=1)[:, :k] if k < len(self) else np.tile(np.arange(len(self)), (len(scores), 1))
+                order = np.argsort(np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+                chunk[:] = np.take_along_axis(top, order, axis=1)
+
+        # exact distances for the selected profiles only, which also settles the order of float32 near-ties
+        selected = self.vectors[indices]
+        if metric == 'euclidean':
+            distances = np.linalg.norm(vectors[:, None, :] - selected, axis=2)
+        else:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                distances = 1 - np.einsum('nc,nkc->nk', vectors, selected) / (np.linalg.norm(vectors, axis=1)[:, None] * self._norms[indices])
+        order = np.argsort(distances, axis=1, kind='stable')
+        return np.take_along_axis(indices, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+    def nearest(self, vector: np.ndarray, k: int = 5, metric: str = 'euclidean', age_group: Optional[str] = None) -> pd.DataFrame:
+        """The `k` closest profiles to one vector, closest first, with their distance and total.
+
+        With `age_group`, `vector` is spending before the age multiplier: it is ranked scaled by the
+        group's multiplier, and distances and totals are divided by it, back into the units of `vector`.
+        """
+        multiplier = self.multiplier(age_group)
+        indices, distances = self.nearest_batch(np.asarray(vector, dtype=np.float64) * multiplier, k, metric)
+        if metric == 'euclidean': distances = distances / multiplier
+        return pd.DataFrame(
+            [(*self.labels(i), distance, self.vectors[i].sum() / multiplier) for i, distance in zip(indices[0], distances[0])],
+            columns=[*PROFILE_LABELS, 'distance', 'total'],
+            index=pd.Index(indices[0], name='profile'),
+        )
+
+    def deviations(self, vector: np.ndarray, profile: int, top: int = 5, age_group: Optional[str] = None) -> pd.DataFrame:
+        """The `top` categories where `vector` differs most from a profile, largest absolute difference first.
+
+        With `age_group`, the profile's amounts are divided by the group's multiplier, into the units of `vector` (see `nearest`).
+        """
+        vector = np.asarray(vector, dtype=np.float64)
+        profile_amounts = self.vectors[profile] / self.multiplier(age_group)
+        difference = vector - profile_amounts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            relative = np.where(profile_amounts != 0, difference / profile_amounts, np.nan)
+        order = np.argsort(-np.abs(difference), kind='stable')[:top]
+        return pd.DataFrame({
+            'category': [self.categories[i] for i in order],
+            'amount': vector[order],
+            'profile amount': profile_amounts[order],
+            'difference': difference[order],
+            'relative difference': relative[order],
+        })
+
+    def match(self, spending: pd.DataFrame, k: int = 1, metric: str = 'euclidean') -> pd.DataFrame:
+        """Batch mode: the `k` closest profiles to each row of a table with one column per category"""
+        missing = [i for i in self.categories if i not in spending.columns]
+        if missing:
+            raise ValueError(f'Spending is missing the columns {missing}')
+
+        indices, distances = self.nearest_batch(spending[self.categories].to_numpy(dtype=np.float64), k, metric)
+        result = {}
+        for rank in range(indices.shape[1]):
+            codes = self.codes[indices[:, rank]]
+            suffix = '' if indices.shape[1] == 1 else f' {rank + 1}'
+            for column, (labels, label_codes) in enumerate(zip(self._labels, codes.T)):
+                result[f'{PROFILE_LABELS[column]}{suffix}'] = np.asarray(labels, dtype=object)[label_codes]
+            result[f'distance{suffix}'] = distances[:, rank]
+        return pd.concat([spending.reset_index(drop=True), pd.DataFrame(result)], axis=1)
+
+
+def match_file(input_path: Path, output_path: Path, k: int = 1, metric: str = 'euclidean', chunksize: int = 50_000) -> int:
+    """Streams a CSV or Parquet file of spending vectors through `ProfileIndex.match`, returning the number of rows"""
+    index = ProfileIndex(load_cube())
+    with ResultWriter(output_path) as writer:
+        for chunk in read_profiles(input_path, chunksize):
+            writer.write(index.match(chunk, k, metric))
+    return writer.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the household profiles closest to a CSV or Parquet file of monthly spending.')
+    parser.add_argument('input', type=Path, help='one row per household, one column per category of the Personal Expenditure table')
+    parser.add_argument('output', type=Path, help='where to write the matches (.csv or .parquet)')
+    parser.add_argument('--k', type=int, default=1, help='number of profiles to match per row')
+    parser.add_argument('--metric', choices=METRICS, default='euclidean')
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(name)s-%(levelname)s|%(lineno)d:  %(message)s', level=logging.INFO)
+    start = time.perf_counter()
+    rows = match_file(args.input, args.output, args.k, args.metric, args.chunksize)
+    log.info(f'Matched {rows} rows in {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""Timing spans for the app's reruns.
+
+Instrumented code runs inside `span(name)` (or a function decorated with `timed(name)`); each finished
+span is kept in an in-process ring buffer of the latest `BUFFER_SIZE` spans, tagged with the rerun it
+belongs to and its parent span, and added to a per-span latency histogram. With
+`FINSIGHT_TELEMETRY_PORT` set, a local endpoint serves them:
+
+    GET  /spans.jsonl    the buffered spans, one JSON object per line
+    GET  /metrics        the histograms in the Prometheus text format
+    POST /profile        profile the next rerun with cProfile
+
+Profiles are written to `FINSIGHT_PROFILE_DIR` (default: the working directory) as
+rerun-<id>-<ms>ms.prof, to be read with pstats or snakeviz. Setting `FINSIGHT_PROFILE_SLOW_MS`
+profiles reruns, one at a time, and keeps the dump only for reruns slower than that.
+"""
+import cProfile
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache, wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+log = logging.getLogger(__name__)
+
+BUFFER_SIZE = 10_000
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PORT_ENV_VAR = 'FINSIGHT_TELEMETRY_PORT'
+PROFILE_DIR_ENV_VAR = 'FINSIGHT_PROFILE_DIR'
+PROFILE_SLOW_MS_ENV_VAR = 'FINSIGHT_PROFILE_SLOW_MS'
+
+
+@dataclass
+class Span:
+    name: str
+    rerun: Optional[int]
+    parent: Optional[str]
+    start: float
+    duration_ms: float
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'count', 'sum')
+
+    def __init__(self):
+        self.buckets = [0] * len(HISTOGRAM_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if seconds <= bound: self.buckets[i] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class SpanRecorder:
+    """Ring buffer of finished spans plus a cumulative histogram per span name; safe to share between sessions"""
+
+    def __init__(self, size: int = BUFFER_SIZE):
+        self.spans: deque = deque(maxlen=size)
+        self.histograms: Dict[str, _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+            self.histograms.setdefault(span.name, _Histogram()).observe(span.duration_ms / 1e3)
+
+    def snapshot(self) -> List[Span]:
+        with self._lock:
+            return list(self.spans)
+
+    def to_jsonl(self) -> str:
+        return ''.join(json.dumps(asdict(i), default=str) + '\n' for i in self.snapshot())
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            histograms = {name: (list(h.buckets), h.count, h.sum) for name, h in self.histograms.items()}
+        lines = [
+            '# HELP finsight_span_seconds Time spent in instrumented spans',
+            '# TYPE finsight_span_seconds histogram',
+        ]
+        for name, (buckets, count, total) in sorted(histograms.items()):
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            for bound, value in zip(HISTOGRAM_BUCKETS, buckets):
+                lines.append(f'finsight_span_seconds_bucket{{span="{label}",le="{bound}"}} {value}')
+            lines.append(f'finsight_span_seconds_bucket{{span="{label}",le="+Inf"}} {count}')
+            lines.append(f'finsight_span_seconds_sum{{span="{label}"}} {total}')
+            lines.append(f'finsight_span_seconds_count{{span="{label}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+recorder = SpanRecorder()
+
+# each Streamlit session reruns on its own thread, so the current rerun and open spans are per thread
+_local = threading.local()
+_rerun_ids = itertools.count(1)
+_profile_next = threading.Event()
+# cProfile can only profile one rerun at a time
+_profiler_lock = threading.Lock()
+
+
+def _stack() -> List[str]:
+    if not hasattr(_local, 'stack'): _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[None]:
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    start, wall_start = time.perf_counter(), time.time()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1e3
+        stack.pop()
+        recorder.record(Span(name, getattr(_local, 'rerun', None), parent, wall_start, duration_ms, attrs))
+
+
+def timed(name: Optional[str] = None):
+    """Decorator that runs the function inside a span named after it"""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def request_profile():
+    """Profile the next rerun on any session"""
+    _profile_next.set()
+
+
+@lru_cache(maxsize=None)
+def _profile_slow_ms() -> Optional[float]:
+    """`FINSIGHT_PROFILE_SLOW_MS` as a number, read once; None when unset or not a valid duration"""
+    value = os.environ.get(PROFILE_SLOW_MS_ENV_VAR)
+    if not value: return None
+    try:
+        slow_ms = float(value)
+    except ValueError:
+        slow_ms = float('nan')
+    if not 0 <= slow_ms < float('inf'):
+        log.warning(f'Ignoring {PROFILE_SLOW_MS_ENV_VAR}={value!r}, expected a number of milliseconds')
+        return None
+    return slow_ms
+
+
+def _start_profiler(requested: bool) -> Optional[cProfile.Profile]:
+    """A running profiler holding `_profiler_lock`, or None when another rerun (or tool) is being profiled"""
+    if not _profiler_lock.acquire(blocking=False):
+        if requested: _profile_next.set()  # left for the next rerun
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Python 3.12+ allows one profiler per process, e.g. a debugger or coverage may hold it
+        _profiler_lock.release()
+        if requested: log.warning(f'Could not profile the rerun: {e}')
+        return None
+    return profiler
+
+
+@contextmanager
+def rerun(**attrs) -> Iterator[None]:
+    """Top-level span for one script run; profiles it when a profile was requested or slow reruns are being caught.
+
+    One rerun is profiled at a time; others running meanwhile are not profiled.
+    """
+    slow_ms = _profile_slow_ms()
+    requested = _profile_next.is_set()
+    if requested: _profile_next.clear()
+
+    rerun_id = next(_rerun_ids)
+    _local.rerun = rerun_id
+    start = time.perf_counter()
+    profiler = _start_profiler(requested) if requested or slow_ms is not None else None
+    try:
+        with span('rerun', **attrs):
+            yield
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1e3
+        _local.rerun = None
+        if profiler:
+            profiler.disable()
+            _profiler_lock.release()
+            if requested or duration_ms >= slow_ms:
+                path = Path(os.environ.get(PROFILE_DIR_ENV_VAR, '.')) / f'rerun-{rerun_id}-{duration_ms:.0f}ms.prof'
+                profiler.dump_stats(path)
+                log.info(f'Wrote the profile of rerun {rerun_id} to {path}')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/spans.jsonl':
+            self._reply(recorder.to_jsonl(), 'application/jsonl')
+        elif self.path == '/metrics':
+            self._reply(recorder.to_prometheus(), 'text/plain; version=0.0.4')
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if self.path == '/profile':
+            request_profile()
+            self._reply('The next rerun will be profiled\n', 'text/plain')
+        else:
+            self.send_error(404)
+
+    def _reply(self, body: str, content_type: str):
+        data = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+_serve_failed = False
+
+
+def serve(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Starts the endpoint on a daemon thread, once per process"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+            threading.Thread(target=_server.serve_forever, name='telemetry', daemon=True).start()
+            log.info(f'Serving spans on http://{host}:{port}')
+    return _server
+
+
+def serve_from_env() -> Optional[ThreadingHTTPServer]:
+    global _serve_failed
+    port = os.environ.get(PORT_ENV_VAR)
+    if not port or _serve_failed: return None
+    try:
+        port_number = int(port)
+        if not 0 < port_number < 65536: raise ValueError
+    except ValueError:
+        # checked on every rerun, so a bad value is reported once and turns the endpoint off
+        _serve_failed = True
+        log.warning(f'Ignoring {PORT_ENV_VAR}={port!r}, expected a port number')
+        return None
+    try:
+        return serve(port_number)
+    except OSError as e:
+        # several workers on one host: the first to bind the port serves it
+        _serve_failed = True
+        log.warning(f'Could not serve spans on port {port}: {e}')
+        return None
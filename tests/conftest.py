@@ -0,0 +1,24 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+# the modules live in the repository root rather than in a package
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import dataset
+
+
+@pytest.fixture(scope='session')
+def compiled() -> dataset.Dataset:
+    return dataset.compile_sources(ROOT)
+
+
+@pytest.fixture
+def source_dir(tmp_path: Path) -> Path:
+    """A copy of the source files, so that artifacts are written outside the repository"""
+    for path in dataset._source_paths(ROOT).values():
+        shutil.copy(path, tmp_path / path.name)
+    return tmp_path
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import dataset
+
+
+def truncated(compiled: dataset.Dataset) -> bytes:
+    """The artifact without the end of its last array; dropping less may only drop alignment padding"""
+    return dataset.artifact_bytes(compiled)[:-dataset.ALIGNMENT]
+
+
+def assert_same(loaded: dataset.Dataset, compiled: dataset.Dataset):
+    assert loaded.category_names == compiled.category_names
+    assert loaded.age_groups == compiled.age_groups
+    assert loaded.sources == compiled.sources
+    np.testing.assert_array_equal(loaded.space_counts, compiled.space_counts)
+    np.testing.assert_array_equal(loaded.parent_idx, compiled.parent_idx)
+    np.testing.assert_array_equal(loaded.expenditure, compiled.expenditure)
+    assert loaded.tables.keys() == compiled.tables.keys()
+    for key, table in compiled.tables.items():
+        assert loaded.tables[key].row_labels == table.row_labels
+        assert loaded.tables[key].columns == table.columns
+        np.testing.assert_array_equal(loaded.tables[key].values, table.values)
+
+
+def test_artifact_round_trip(compiled):
+    buffer = np.frombuffer(dataset.artifact_bytes(compiled), dtype=np.uint8)
+    loaded = dataset.read_buffer(buffer, 'artifact')
+    assert_same(loaded, compiled)
+    assert not loaded.expenditure.flags.writeable
+
+
+def test_artifact_file_round_trip(compiled, tmp_path):
+    path = tmp_path / dataset.ARTIFACT
+    dataset.write_artifact(compiled, path)
+    assert_same(dataset.read_artifact(path), compiled)
+
+
+@pytest.mark.parametrize('length', [0, 4, 100, 2000])
+def test_truncated_artifact_is_rejected(compiled, tmp_path, length):
+    path = tmp_path / dataset.ARTIFACT
+    path.write_bytes(dataset.artifact_bytes(compiled)[:length])
+    with pytest.raises(dataset.DatasetError):
+        dataset.read_artifact(path)
+
+
+def test_artifact_missing_array_data_is_rejected(compiled):
+    with pytest.raises(dataset.DatasetError, match='does not fit'):
+        dataset.read_buffer(np.frombuffer(truncated(compiled), dtype=np.uint8), 'artifact')
+
+
+def test_corrupted_artifact_is_rejected(compiled):
+    data = bytearray(dataset.artifact_bytes(compiled))
+    data[len(dataset.MAGIC) + 8:len(dataset.MAGIC) + 12] = b'!!!!'
+    with pytest.raises(dataset.DatasetError):
+        dataset.read_buffer(np.frombuffer(bytes(data), dtype=np.uint8), 'artifact')
+
+
+def test_load_rebuilds_truncated_artifact(compiled, source_dir):
+    artifact = source_dir / dataset.ARTIFACT
+    artifact.write_bytes(truncated(compiled))
+    assert_same(dataset.load(source_dir), compiled)
+    assert artifact.read_bytes() == dataset.artifact_bytes(compiled)
+
+
+def test_load_without_sources_rejects_truncated_artifact(compiled, tmp_path):
+    (tmp_path / dataset.ARTIFACT).write_bytes(truncated(compiled))
+    with pytest.raises(dataset.DatasetError):
+        dataset.load(tmp_path)
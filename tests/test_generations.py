@@ -0,0 +1,28 @@
+import gc
+import os
+
+import generations
+import shared_data
+
+
+def test_reload_releases_old_generations(source_dir, monkeypatch):
+    monkeypatch.delenv(shared_data.ENV_VAR, raising=False)
+    store = generations.DataStore(source_dir)
+    store.current.build()
+    for _ in range(3):
+        assert store.reload(force=True)
+
+    gc.collect()
+    assert store.current.number == 4
+    assert [i.number for i in generations.live_generations() if i.source_dir == source_dir] == [4]
+
+
+def test_unchanged_sources_are_not_reloaded(source_dir, monkeypatch):
+    monkeypatch.delenv(shared_data.ENV_VAR, raising=False)
+    store = generations.DataStore(source_dir)
+    store.current.dataset
+    path = source_dir / generations.dataset.EXPENDITURE_CSV
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert not store.reload()
+    assert store.current.number == 1
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from incremental import SpendingModel
+
+COLUMN = 2
+
+
+@pytest.fixture
+def model() -> SpendingModel:
+    return SpendingModel(('profile',), np.array([100.0, 200.0, 300.0, 400.0]), household_members=2)
+
+
+def test_edits_are_applied(model):
+    assert model.apply_edits({'1:2': 250.0, '3:2': None, '0:1': 'ignored'}, COLUMN) == [1, 3]
+    np.testing.assert_array_equal(model.values, [100.0, 250.0, 300.0, 0.0])
+    assert model.total == 650.0
+    assert model.household_total == 1300.0
+    np.testing.assert_array_equal(model.edited_rows, [1, 3])
+
+
+def test_apply_edits_is_idempotent_across_reruns(model):
+    # every rerun reports all the edits made in the editor so far
+    edits = {'1:2': 250.0}
+    assert model.apply_edits(edits, COLUMN) == [1]
+    for _ in range(3):
+        assert model.apply_edits(edits, COLUMN) == []
+    assert model.total == 1050.0
+
+    edits['2:2'] = 0.0
+    assert model.apply_edits(edits, COLUMN) == [2]
+    assert model.apply_edits(edits, COLUMN) == []
+    np.testing.assert_array_equal(model.values, [100.0, 250.0, 0.0, 400.0])
+    assert model.total == 750.0
+
+
+def test_edit_back_to_the_original_amount(model):
+    model.apply_edits({'0:2': 50.0}, COLUMN)
+    assert model.apply_edits({'0:2': 100.0}, COLUMN) == [0]
+    assert model.total == 1000.0
+    assert len(model.edited_rows) == 0
+
+
+def test_new_editor_starts_from_the_current_amounts(model):
+    model.apply_edits({'1:2': 250.0}, COLUMN)
+    generation = model.editor_generation
+    model.new_editor()
+    assert model.editor_generation == generation + 1
+    np.testing.assert_array_equal(model.editor_base, model.values)
+
+    # the new editor reports no edits yet, and the earlier one is kept
+    assert model.apply_edits({}, COLUMN) == []
+    assert model.values[1] == 250.0
+
+    # what the old editor reported is forgotten, so the same amount from the new one is applied again
+    model.set(1, 200.0)
+    assert model.apply_edits({'1:2': 250.0}, COLUMN) == [1]
+    assert model.total == 1050.0
+
+def test_editor_base_does_not_follow_edits(model):
+    model.apply_edits({'1:2': 250.0}, COLUMN)
+    np.testing.assert_array_equal(model.editor_base, model.baseline)
+    np.testing.assert_array_equal(model.baseline, [100.0, 200.0, 300.0, 400.0])
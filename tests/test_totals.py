@@ -0,0 +1,62 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from Categories import CategoryTree
+import dataset
+import totals
+
+
+def tree_of(compiled: dataset.Dataset) -> CategoryTree:
+    return CategoryTree(i for i in dataset.build_categories(compiled) if 'total' not in i.name.lower())
+
+
+def with_expenditure(compiled: dataset.Dataset, row: int, column: int, delta: float) -> dataset.Dataset:
+    expenditure = np.array(compiled.expenditure)
+    expenditure[row, column] += delta
+    return dataclasses.replace(compiled, expenditure=expenditure)
+
+
+def test_published_totals_match(compiled):
+    assert totals.check(tree_of(compiled), compiled) == []
+
+
+def test_modified_subtotal_is_flagged(compiled):
+    row, column = compiled.category_names.index('FOOD'), compiled.age_groups.index('Total')
+    modified = with_expenditure(compiled, row, column, 10.0)
+    mismatches = totals.check(tree_of(modified), modified)
+    assert [(i.table, i.row, i.column) for i in mismatches] == [('expenditure', 'FOOD AND NON-ALCOHOLIC BEVERAGES > FOOD', 'Total')]
+    assert mismatches[0].published == pytest.approx(compiled.expenditure[row, column] + 10.0)
+
+
+def test_modified_leaf_is_flagged_in_every_total_above_it(compiled):
+    row, column = compiled.category_names.index('Meat'), compiled.age_groups.index('Total')
+    modified = with_expenditure(compiled, row, column, 10.0)
+    rows = {i.row for i in totals.check(tree_of(modified), modified)}
+    assert 'FOOD AND NON-ALCOHOLIC BEVERAGES > FOOD' in rows
+    assert 'FOOD AND NON-ALCOHOLIC BEVERAGES' in rows
+    assert 'TOTAL' in rows
+
+
+def test_difference_within_rounding_is_not_flagged(compiled):
+    row, column = compiled.category_names.index('FOOD'), compiled.age_groups.index('Total')
+    modified = with_expenditure(compiled, row, column, totals.ROUNDING)
+    assert totals.check(tree_of(modified), modified) == []
+
+
+def test_modified_member_table_total_is_flagged(compiled):
+    table = compiled.tables['bynum']
+    row = next(i for i, label in enumerate(table.row_labels) if 'total' in label.lower())
+    values = np.array(table.values)
+    values[row, 0] += 10.0
+    modified = dataclasses.replace(compiled, tables={**compiled.tables, 'bynum': dataclasses.replace(table, values=values)})
+    assert [(i.table, i.row, i.column) for i in totals.check(tree_of(modified), modified)] == \
+        [('bynum', table.row_labels[row], table.columns[0])]
+
+
+def test_rollup_sums_the_leaves(compiled):
+    tree = tree_of(compiled)
+    sums = totals.rollup(tree)
+    for i in range(len(tree)):
+        np.testing.assert_allclose(sums[i], tree.matrix[i:tree.subtree_end[i]][tree.is_leaf[i:tree.subtree_end[i]]].sum(axis=0))
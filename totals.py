@@ -0,0 +1,134 @@
+"""Checks the bottom-up totals against the totals published in the source files.
+
+The category tree leaves the total rows of the source files out, and the pages show the published
+amounts. `check` sums the leaves under every category (its bottom-up roll-up), and the category rows
+of the member tables, and compares them with the published totals they should reproduce:
+
+- every category with subcategories, whose own row is the published subtotal, for every age group
+- the total rows of the expenditure table, for every age group
+- the total rows of the member tables, for every household size, dwelling type and income quintile
+
+SingStat's plain totals leave out imputed rental of owner-occupied accommodation, which the "Total,
+including imputed rental ..." rows add. Amounts are published to one decimal place, so a sum of n of
+them may be off from the published total by up to `ROUNDING` * (n + 1); only larger differences count.
+
+    python totals.py        # lists the mismatches, exits with 1 if there are any
+"""
+import argparse
+import logging
+import sys
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+
+from Categories import CategoryTree
+import dataset
+import shared_data
+
+log = logging.getLogger(__name__)
+
+# half the precision amounts are published with
+ROUNDING = 0.05
+EXCLUDED_FROM_TOTAL = 'imputed rental'
+
+
+@dataclass
+class Mismatch:
+    table: str
+    row: str
+    column: str
+    published: float
+    computed: float
+    tolerance: float
+
+    def __str__(self) -> str:
+        return f'{self.table} | {self.row} | {self.column}: published {self.published:.1f}, computed {self.computed:.2f} (tolerance {self.tolerance:.2f})'
+
+
+def _is_total(label: str) -> bool:
+    return 'total' in label.lower()
+
+
+def _total_components(total_label: str, labels: Sequence[str]) -> List[int]:
+    """Indices of the rows a published total adds up, among `labels` (which hold no total rows)"""
+    including = 'including' in total_label.lower()
+    return [i for i, label in enumerate(labels) if including or EXCLUDED_FROM_TOTAL not in label.lower()]
+
+
+def _compare(table: str, rows: Sequence[str], columns: Sequence[str], published: np.ndarray, computed: np.ndarray,
+             counts: np.ndarray, rounding: float) -> List[Mismatch]:
+    """Mismatches of (row, column) arrays, `counts` being how many published amounts went into each row's sum"""
+    tolerance = np.broadcast_to(rounding * (np.asarray(counts)[:, None] + 1), published.shape)
+    with np.errstate(invalid='ignore'):
+        bad = np.argwhere(~(np.abs(published - computed) <= tolerance + 1e-9) & ~(np.isnan(published) & np.isnan(computed)))
+    return [Mismatch(table, rows[i], columns[j], float(published[i, j]), float(computed[i, j]), float(tolerance[i, j])) for i, j in bad]
+
+
+def rollup(tree: CategoryTree) -> np.ndarray:
+    """(category, age group) sums of the leaves under every node of `tree`, leaves being their own sum"""
+    # children are added into their parents from the deepest level up, so every node's leaves are summed once
+    depths = np.array([len(tree.path_of(i)) - 1 for i in tree.nodes], dtype=np.intp)
+    sums = np.where(tree.is_leaf[:, None], tree.matrix, 0.0)
+    for depth in range(int(depths.max(initial=0)), 0, -1):
+        idxs = np.flatnonzero(depths == depth)
+        np.add.at(sums, tree.parent_idx[idxs], sums[idxs])
+    return sums
+
+
+def check(tree: CategoryTree, compiled: dataset.Dataset, rounding: float = ROUNDING) -> List[Mismatch]:
+    mismatches: List[Mismatch] = []
+    sums = rollup(tree)
+
+    # leaves under each node, by the depth-first blocks every subtree occupies
+    leaf_counts = np.concatenate([[0], np.cumsum(tree.is_leaf)])
+    leaf_counts = leaf_counts[tree.subtree_end] - leaf_counts[:len(tree)]
+    inner = np.flatnonzero(~tree.is_leaf)
+    mismatches += _compare('expenditure', [' > '.join(i.name for i in tree.path_of(tree.nodes[j])) for j in inner], tree.age_groups,
+                           tree.matrix[inner], sums[inner], leaf_counts[inner], rounding)
+
+    roots = np.flatnonzero(tree.parent_idx < 0)
+    root_labels = [tree.nodes[i].name for i in roots]
+    columns = [compiled.age_groups.index(i) for i in tree.age_groups]
+    for row, label in enumerate(compiled.category_names):
+        if not _is_total(label): continue
+        components = roots[_total_components(label, root_labels)]
+        mismatches += _compare('expenditure', [label], tree.age_groups, compiled.expenditure[row, columns][None],
+                               sums[components].sum(axis=0)[None], [leaf_counts[components].sum()], rounding)
+
+    for key, table in compiled.tables.items():
+        categories = [i for i, label in enumerate(table.row_labels) if not _is_total(label)]
+        category_labels = [table.row_labels[i] for i in categories]
+        for row, label in enumerate(table.row_labels):
+            if not _is_total(label): continue
+            components = [categories[i] for i in _total_components(label, category_labels)]
+            mismatches += _compare(key, [label], table.columns, table.values[row][None],
+                                   table.values[components].sum(axis=0)[None], [len(components)], rounding)
+    return mismatches
+
+
+def report(mismatches: Sequence[Mismatch], limit: int = 10):
+    """Logs the mismatches found when a dataset is loaded"""
+    if not mismatches:
+        log.info('All totals match the published totals')
+        return
+    log.warning(f'{len(mismatches)} totals differ from the published totals:' + ''.join(f'\n  {i}' for i in mismatches[:limit]) +
+                (f'\n  ... and {len(mismatches) - limit} more' if len(mismatches) > limit else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the bottom-up totals against the published totals.')
+    parser.add_argument('--source-dir', type=dataset.Path, default=dataset.cwd)
+    parser.add_argument('--rounding', type=float, default=ROUNDING, help='allowed difference per amount summed')
+    args = parser.parse_args()
+
+    compiled = shared_data.load(args.source_dir)
+    tree = CategoryTree(i for i in dataset.build_categories(compiled) if not _is_total(i.name))
+    mismatches = check(tree, compiled, args.rounding)
+    for mismatch in mismatches: print(mismatch)
+    print(f'{len(mismatches)} mismatches')
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()